@@ -0,0 +1,69 @@
+import os
+import sys
+import atexit
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 不带参数的 --ref 与这些分支中第一个存在且已分叉的求 merge-base，即本分支改动之前的版本
+BASELINE_BRANCHES = ('origin/HEAD', 'origin/main', 'origin/master', 'main', 'master')
+MERGE_BASE = 'merge-base'
+_temp_dirs = [] # --ref 导出的临时目录，退出时删除
+
+
+def cleanup():
+    """删除 --ref 导出的临时目录；正常退出时自动调用，用 os._exit 退出前需手动调用"""
+    while _temp_dirs:
+        shutil.rmtree(_temp_dirs.pop(), ignore_errors=True)
+
+
+atexit.register(cleanup)
+
+
+def _git(*args):
+    result = subprocess.run(['git', *args], cwd=REPO_DIR, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def resolve_ref(ref):
+    """把 --ref 的值解析为提交；merge-base 表示当前分支与上游主分支的分叉点"""
+    if ref != MERGE_BASE:
+        return ref
+    head = _git('rev-parse', 'HEAD')
+    for branch in BASELINE_BRANCHES:
+        base = _git('merge-base', 'HEAD', branch)
+        if base and base != head:
+            return base
+    sys.exit("找不到与当前分支分叉的上游主分支，请用 --ref <版本> 指定对比的版本")
+
+
+def parse_args(description, add_arguments=None):
+    """
+    解析基准脚本的公共参数，并把被测源码目录放到 sys.path 最前面。
+    --ref 指定 git 版本 (分支、标签或提交) 时，先把该版本导出到临时目录再导入，
+    用同一脚本分别跑新旧版本即可对比；只写 --ref 时对比当前分支与上游主分支的分叉点。
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--ref', nargs='?', const=MERGE_BASE,
+                        help='测量指定 git 版本的代码，不带值时为与上游主分支的 merge-base；默认测量当前工作区')
+    if add_arguments:
+        add_arguments(parser)
+    args = parser.parse_args()
+
+    src = REPO_DIR
+    if args.ref:
+        args.ref = resolve_ref(args.ref)
+        src = tempfile.mkdtemp(prefix='fanqie-bench-')
+        _temp_dirs.append(src)
+        archive = subprocess.run(['git', 'archive', args.ref], cwd=REPO_DIR, check=True, capture_output=True).stdout
+        subprocess.run(['tar', '-x', '-C', src], input=archive, check=True)
+    sys.path.insert(0, src)
+    return args
+
+
+def best_of(func, number, repeat=5):
+    """执行 repeat 轮、每轮 number 次，返回最快一轮的单次耗时 (秒)"""
+    import timeit
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
@@ -0,0 +1,69 @@
+"""
+章节页面分类基准：检查按原始字节分类 (classify_page) 与完整解析后的判断一致，
+并比较两者的耗时。测试页面包含 <head> 超过 8 KB (大段内联脚本/样式) 的风控页和锁定页。
+
+用法:
+    python benchmarks/bench_classify.py
+"""
+import sys
+
+from _common import parse_args, best_of
+
+BIG_SCRIPT = '<script>var config = {' + ','.join(f'"k{i}": "{"x" * 40}"' for i in range(300)) + '};</script>'
+BIG_STYLE = '<style>' + ''.join(f'.c{i} {{ margin: {i}px; padding: 0; }}' for i in range(400)) + '</style>'
+
+
+def _page(head, body):
+    return f'<html><head>{head}</head><body>{body}</body></html>'.encode('utf-8')
+
+
+CASES = {
+    'content': _page('<title>第1章</title>', '<div class="muye-reader-content noselect"><p>正文</p></div>'),
+    'waf_title': _page('<title>WAF 验证</title>', '<div>请稍候</div>'),
+    'waf_title_big_head': _page(BIG_SCRIPT + BIG_STYLE + '<title>安全验证</title>', '<div>请稍候</div>'),
+    'waf_body': _page('<title>提示</title>', '<div id="captcha-box"></div>'),
+    'waf_body_big_head': _page(BIG_SCRIPT + '<title>提示</title>', '<script src="/verify.js"></script>'),
+    'vip': _page('<title>第2章</title>', '<div class="lock">本章为付费章节</div>'),
+    'vip_big_head': _page(BIG_SCRIPT + BIG_STYLE + '<title>第3章</title>', '<div class="lock">本章为付费章节</div>'),
+}
+
+
+def main():
+    parse_args('章节页面分类基准')
+    from downloader import FanqieDownloader
+    from page_classifier import PAGE_CONTENT, PAGE_WAF, PAGE_VIP, classify_page
+
+    downloader = FanqieDownloader()
+
+    def full_parse(body):
+        # 与改用字节分类之前的判断相同：解析页面，再按正文节点、标题和页面文本判断
+        content, title = downloader._parse_chapter_page(body, 'bs4')
+        if content is not None:
+            return PAGE_CONTENT
+        title = title or ''
+        text = body.decode('utf-8')
+        if 'WAF' in title or '验证' in title or 'captcha' in text or 'verify' in text:
+            return PAGE_WAF
+        return PAGE_VIP
+
+    mismatches = 0
+    for name, body in CASES.items():
+        expected = full_parse(body)
+        actual = classify_page(200, body)
+        if actual != expected:
+            mismatches += 1
+        print(f"{name:20s} {len(body) // 1024:3d} KB  完整解析 {expected:8s} 字节分类 {actual:8s}{'' if actual == expected else '  不一致'}")
+
+    for name in ('waf_title_big_head', 'vip_big_head'):
+        body = CASES[name]
+        parsed = best_of(lambda: full_parse(body), number=20)
+        classified = best_of(lambda: classify_page(200, body), number=2000)
+        print(f"{name}: 完整解析 {parsed * 1e6:.0f} us, 字节分类 {classified * 1e6:.1f} us")
+
+    if mismatches:
+        print(f"检查失败: {mismatches} 个页面分类不一致")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
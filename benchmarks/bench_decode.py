@@ -0,0 +1,35 @@
+"""
+混淆字符解码基准：随机生成混淆字符与普通汉字混合的文本，测量 decode_text 的耗时。
+同时与逐字调用 decode_char 的结果比对 (覆盖全部码位)，确保两者一致。
+
+用法:
+    python benchmarks/bench_decode.py              # 当前工作区
+    python benchmarks/bench_decode.py --ref        # 本分支改动之前的版本 (逐字解码)
+"""
+import random
+
+from _common import parse_args, best_of
+
+PLAIN = '普通中文字符，。的一了是我不人有他这中大来上国个到说们为子和你地出道也时年'
+
+
+def main():
+    parse_args('混淆字符解码基准')
+    from downloader import FanqieDownloader
+    downloader = FanqieDownloader()
+
+    every_char = ''.join(chr(c) for c in range(0x11170) if not 0xD800 <= c <= 0xDFFF)
+    reference = ''.join(downloader.decode_char(ord(c)) for c in every_char)
+    print("与 decode_char 逐字解码一致:", downloader.decode_text(every_char) == reference)
+
+    rng = random.Random(1)
+    obfuscated = [chr(c) for c in range(downloader.code_start, downloader.code_end + 1)]
+    for length in (20, 200, 2000):
+        text = ''.join(rng.choice(obfuscated) if rng.random() < 0.4 else rng.choice(PLAIN) for _ in range(length))
+        number = max(1, 200000 // length)
+        elapsed = best_of(lambda: downloader.decode_text(text), number=number)
+        print(f"{length:5d} 字: {elapsed * 1e6:8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
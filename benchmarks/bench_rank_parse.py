@@ -0,0 +1,45 @@
+"""
+排行榜解析基准：先检查每个测试页面的解析结果与保存的 .json 一致，再对最大的页面计时。
+
+用法:
+    python benchmarks/bench_rank_parse.py              # 当前工作区
+    python benchmarks/bench_rank_parse.py --ref        # 本分支改动之前的版本 (BeautifulSoup 解析)
+"""
+import os
+import glob
+import json
+
+from _common import parse_args, best_of
+from make_rank_fixtures import FIXTURE_DIR
+
+
+def main():
+    parse_args('排行榜解析基准')
+    from downloader import FanqieDownloader
+    downloader = FanqieDownloader()
+
+    pages = sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))
+    if not pages:
+        print("未找到测试页面，请先运行 make_rank_fixtures.py")
+        return
+    mismatches = 0
+    for path in pages:
+        with open(path, encoding='utf-8') as f:
+            page = f.read()
+        with open(path[:-5] + '.json', encoding='utf-8') as f:
+            expected = json.load(f)
+        if downloader.parse_rank_books(page) != expected:
+            mismatches += 1
+            print(f"结果不一致: {os.path.basename(path)}")
+    print(f"一致性: {len(pages) - mismatches}/{len(pages)}")
+
+    largest = max(pages, key=os.path.getsize)
+    with open(largest, encoding='utf-8') as f:
+        page = f.read()
+    books = len(downloader.parse_rank_books(page))
+    elapsed = best_of(lambda: downloader.parse_rank_books(page), number=3, repeat=3)
+    print(f"{os.path.basename(largest)} ({books} 本, {len(page.encode()) // 1024} KB): {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+跨书籍章节调度基准：同时下载一本大书和几本小书 (单本并发均为 1)，
+获取线程数按下载管理器的总预算 (同时下载任务数 × 单本并发数) 设置。
+检查小书完成后，大书是否用上了空出的线程。每章获取耗时固定，用 sleep 模拟。
+
+用法:
+    python benchmarks/bench_scheduler.py
+"""
+import sys
+import time
+import threading
+
+from _common import parse_args
+
+
+def main():
+    args = parse_args('跨书籍章节调度基准', lambda parser: (
+        parser.add_argument('--tasks', type=int, default=4, help='同时下载任务数'),
+        parser.add_argument('--big', type=int, default=200, help='大书章节数'),
+        parser.add_argument('--small', type=int, default=10, help='小书章节数'),
+        parser.add_argument('--fetch-ms', type=float, default=20, help='每章获取耗时 (毫秒)'),
+    ))
+    from chapter_scheduler import ChapterScheduler
+
+    # 单本并发均为 1，总预算即同时下载任务数
+    scheduler = ChapterScheduler(args.tasks)
+    lock = threading.Lock()
+    inflight = {'big': 0}
+    small_done = threading.Event()
+    big_peak_after_small = [0]
+
+    def fetch_big(item):
+        with lock:
+            inflight['big'] += 1
+            if small_done.is_set():
+                big_peak_after_small[0] = max(big_peak_after_small[0], inflight['big'])
+        time.sleep(args.fetch_ms / 1000)
+        with lock:
+            inflight['big'] -= 1
+        return item
+
+    def fetch_small(item):
+        time.sleep(args.fetch_ms / 1000)
+        return item
+
+    start = time.perf_counter()
+    big = scheduler.submit(fetch_big, list(range(args.big)), limit=1)
+    smalls = [scheduler.submit(fetch_small, list(range(args.small)), limit=1) for _ in range(args.tasks - 1)]
+    finished = {}
+
+    def consume(name, job):
+        for _ in job.results_in_order():
+            pass
+        finished[name] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=consume, args=(f'small{i}', job)) for i, job in enumerate(smalls)]
+    for thread in threads:
+        thread.start()
+    big_thread = threading.Thread(target=consume, args=('big', big))
+    big_thread.start()
+    for thread in threads:
+        thread.join()
+    small_done.set()
+    big_thread.join()
+    scheduler.close()
+
+    serial = args.big * args.fetch_ms / 1000
+    print(f"获取线程: {scheduler.target_workers}")
+    print(f"小书完成: {max(v for k, v in finished.items() if k != 'big'):.2f} s")
+    print(f"大书完成: {finished['big']:.2f} s (单线程顺序获取约 {serial:.2f} s)")
+    print(f"小书完成后大书同时获取的章节数峰值: {big_peak_after_small[0]}")
+    if args.tasks > 1 and big_peak_after_small[0] < 2:
+        print("检查失败: 小书完成后空出的线程没有转去获取大书")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
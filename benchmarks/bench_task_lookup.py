@@ -0,0 +1,109 @@
+"""
+下载队列按 ID 查找的基准：添加大量任务后，按界面收到信号时的路径逐个更新进度和状态，
+测量 DownloadManager.get_task 与下载管理窗口更新列表项的耗时。
+条目控件的重绘被替换为空操作，只测查找本身。
+
+用法:
+    python benchmarks/bench_task_lookup.py              # 当前工作区
+    python benchmarks/bench_task_lookup.py --ref        # 本分支改动之前的版本 (逐行扫描)
+"""
+import os
+import sys
+import time
+
+from _common import parse_args, cleanup
+
+
+def main():
+    args = parse_args('下载队列查找基准',
+                      lambda parser: parser.add_argument('--tasks', type=int, default=1000, help='任务数量'))
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtCore import QObject, Signal
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+
+    import download_manager
+    import download_ui
+    from downloader import FanqieDownloader
+
+    class IdleWorker(QObject):
+        """不实际下载的工作线程，只提供管理器需要的信号和接口"""
+        progress_signal = Signal(int, int, str)
+        finished_signal = Signal(str)
+        error_signal = Signal(str)
+        verification_needed_signal = Signal(str)
+        log_signal = Signal(str)
+
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+            self.running = False
+            self.is_paused = False
+            self.book_info = None
+
+        def isRunning(self):
+            return self.running
+
+        def start(self):
+            self.running = True
+
+        def stop(self):
+            self.running = False
+
+        def wait(self, *args):
+            return True
+
+    download_manager.DownloadWorker = IdleWorker
+    item_widget = download_ui.DownloadingItemWidget
+    item_widget.load_cover = item_widget.update_progress = item_widget.update_status = lambda self, *a: None
+
+    manager = download_manager.DownloadManager(FanqieDownloader())
+    manager.set_max_concurrent_tasks(2)
+    window = download_ui.DownloadManagerWindow()
+    manager.task_added.connect(window.add_downloading_item)
+
+    def on_updated(task_id, current, total, msg):
+        # 与主窗口的处理一致：先找到任务，再更新对应的列表项
+        manager.get_task(task_id)
+        window.update_downloading_item(task_id, current, total, msg, None)
+
+    start = time.perf_counter()
+    for i in range(args.tasks):
+        manager.add_single_task(f'https://fanqienovel.com/page/{7000000 + i}', os.getcwd(), 'txt', title=f'book{i}')
+    added = time.perf_counter() - start
+
+    task_ids = [task.id for task in manager.tasks]
+    rounds = 5
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for current in range(rounds):
+            for task_id in task_ids:
+                on_updated(task_id, current, rounds, "下载中")
+                window.update_downloading_item_status(task_id, 'running')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    updates = rounds * len(task_ids)
+    print(f"添加 {args.tasks} 个任务: {added:.2f} s")
+    print(f"{updates} 次进度+状态更新: {best:.2f} s ({best / updates * 1e6:.0f} us/次)")
+
+    # 与程序退出时相同的顺序释放：先停止管理器 (关闭章节调度器和连接池)，再销毁窗口和 QApplication，
+    # 避免解释器退出时 Qt 对象和后台线程仍然存在
+    manager.stop_all()
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    if hasattr(app, 'shutdown'): # 较新的 PySide6 才提供，显式销毁 QApplication
+        app.shutdown()
+
+    if sys.version_info < (3, 12):
+        # 部分 PySide6 版本的 Signal.emit 每次调用都少计一次 True 的引用，
+        # Python 3.12 之前 True 不是永久对象，发出上千次信号后会在解释器清理阶段触发 bool_dealloc 崩溃。
+        # 资源已在上面释放，这里跳过解释器清理直接退出
+        cleanup()
+        sys.stdout.flush()
+        os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
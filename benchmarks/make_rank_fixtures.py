@@ -0,0 +1,80 @@
+"""
+生成排行榜解析的测试页面 (benchmarks/fixtures/rank)。
+页面结构参照排行榜的书籍卡片，随机组合标题标签与类名、包装层数、缺失的 alt、
+重复链接、注释以及各种状态/更新文本，书名使用混淆字符。
+每个页面旁边保存一份 .json，是 --ref 指定版本解析出的结果，bench_rank_parse.py 据此检查一致性。
+
+用法: python benchmarks/make_rank_fixtures.py --ref   # 以本分支改动之前的解析结果为准
+"""
+import os
+import json
+import random
+
+from _common import parse_args
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'rank')
+
+OBFUSCATED = [chr(c) for c in range(58344, 58716)] + list('天地玄黄宇宙洪荒')
+UPDATE_TEMPLATES = [
+    '<span>最近更新：第{0}章 {1}</span><span>2024-05-0{2} 12:0{2}</span>',
+    '<span>最近更新 | 第{0}章 {1}</span>',
+    '<span>最近更新</span><span>2024-05-0{2}</span>',
+    '',
+]
+
+
+def _word(rng, k):
+    return ''.join(rng.choice(OBFUSCATED) for _ in range(k))
+
+
+def _item(rng, i, variant):
+    url = f'/page/{7000000 + i}'
+    alt = f' alt="{_word(rng, 5)}"' if variant % 3 else ''
+    title_tag = rng.choice(['h1', 'h2', 'h3', 'h4', 'div', 'span'])
+    cls = rng.choice(['title', 'book-name', 'x-title y', 'info', ''])
+    status = rng.choice(['连载中', '已完结', ''])
+    update = rng.choice(UPDATE_TEMPLATES).format(i, _word(rng, 4), i % 9 + 1)
+    wrap = rng.choice([0, 1, 2])
+    info = (f'<div class="book-info"><{title_tag} class="{cls}"><a href="{url}">{_word(rng, 6)} <!--c--> {_word(rng, 2)}</a></{title_tag}>'
+            f'<div class="author">{_word(rng, 3)}</div><div class="footer"><span>{status}</span>'
+            f'<span>在读：{rng.randint(1, 999)}.{rng.randint(0, 9)}万</span></div>'
+            f'<div class="last">{update}</div></div>')
+    cover_url = url if variant % 4 else 'https://fanqienovel.com' + url
+    cover = f'<div class="book-cover"><a href="{cover_url}"><img{alt} src="c.jpg"/><span class="book-name">{_word(rng, 4)}</span></a></div>'
+    body = cover + info
+    for _ in range(wrap):
+        body = f'<div>{body}</div>'
+    if variant % 7 == 0:
+        body += f'<a href="{url}">  {_word(rng, 3)}  x y </a>'
+    return f'<div class="rank-book-item">{body}</div>'
+
+
+def make_page(book_count, seed):
+    rng = random.Random(seed)
+    items = ''.join(_item(rng, i, rng.randint(0, 20)) for i in range(book_count))
+    return ('<html><head><title>rank</title><script>var s="<a href=\'/page/1\'>x</a>";</script></head><body>'
+            '<div class="nav"><a href="/rank">r</a><a href="/page/999">热门 书</a></div>'
+            f'<div class="rank-list">{items}</div>连载中</body></html>')
+
+
+# (文件名, 书籍数, 随机种子)；最后一个大页面同时用于计时
+PAGES = [(f'rank_{seed:02d}', random.Random(seed).randint(1, 30), seed) for seed in range(12)] + [('rank_500', 500, 12345)]
+
+
+def main():
+    parse_args('生成排行榜解析测试页面')
+    from downloader import FanqieDownloader
+    downloader = FanqieDownloader()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, book_count, seed in PAGES:
+        page = make_page(book_count, seed)
+        with open(os.path.join(FIXTURE_DIR, name + '.html'), 'w', encoding='utf-8') as f:
+            f.write(page)
+        books = downloader.parse_rank_books(page)
+        with open(os.path.join(FIXTURE_DIR, name + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(books, f, ensure_ascii=False, indent=0)
+        print(f"{name}: 解析出 {len(books)} 本")
+
+
+if __name__ == '__main__':
+    main()
@@ -34,11 +34,20 @@ pyinstaller --noconfirm --windowed --clean --name "FanqieNovelDownloader" %ICON_
 echo.
 echo Cleaning up source files from distribution...
 cd dist\FanqieNovelDownloader\_internal
+if exist chapter_list.py del chapter_list.py
+if exist chapter_scheduler.py del chapter_scheduler.py
+if exist content_cache.py del content_cache.py
 if exist download_manager.py del download_manager.py
 if exist download_ui.py del download_ui.py
 if exist downloader.py del downloader.py
+if exist epub_writer.py del epub_writer.py
+if exist image_cache.py del image_cache.py
 if exist logging_config.py del logging_config.py
 if exist main.py del main.py
+if exist page_classifier.py del page_classifier.py
+if exist progress_manifest.py del progress_manifest.py
+if exist rate_limiter.py del rate_limiter.py
+if exist task_journal.py del task_journal.py
 if exist ui_components.py del ui_components.py
 if exist update_manager.py del update_manager.py
 if exist version.py del version.py
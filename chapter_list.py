@@ -0,0 +1,92 @@
+from array import array
+
+
+class ChapterList:
+    """
+    紧凑的章节列表。
+    章节 ID 存放在整数数组中，URL 在访问时按前缀拼接；所有标题拼接成一个字符串，
+    只记录每个标题的结束位置。相比每章一个 {'title', 'url'} 字典，内存占用小得多，
+    适合批量下载时同时保留大量书籍的目录。
+    支持 len()、下标 (返回 {'title', 'url'} 字典) 和迭代，可替代原来的字典列表使用。
+    """
+
+    URL_PREFIX = 'https://fanqienovel.com/reader/'
+    MAX_ID = 2 ** 64 - 1
+
+    def __init__(self, chapters=()):
+        """
+        :param chapters: {'title', 'url'} 字典的可迭代对象
+        """
+        self.ids = array('Q') # 0 表示 URL 不是标准格式，完整 URL 存在 other_urls 中
+        self.title_ends = array('Q')
+        self.titles = ''
+        self.other_urls = {} # 索引 -> 完整 URL
+        self._extend((chapter['title'], chapter['url']) for chapter in chapters)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """由 (标题, URL) 序列构建"""
+        chapters = cls()
+        chapters._extend(pairs)
+        return chapters
+
+    def _extend(self, pairs):
+        parts = [self.titles]
+        end = len(self.titles)
+        prefix_len = len(self.URL_PREFIX)
+        for title, url in pairs:
+            chapter_id = 0
+            if url.startswith(self.URL_PREFIX):
+                tail = url[prefix_len:]
+                # 只压缩纯数字且能原样还原的 ID (不含前导零、查询参数等)
+                if tail.isdigit() and tail[0] != '0' and int(tail) <= self.MAX_ID:
+                    chapter_id = int(tail)
+            if not chapter_id:
+                self.other_urls[len(self.ids)] = url
+            self.ids.append(chapter_id)
+            parts.append(title)
+            end += len(title)
+            self.title_ends.append(end)
+        self.titles = ''.join(parts)
+
+    def title(self, index):
+        start = self.title_ends[index - 1] if index > 0 else 0
+        return self.titles[start:self.title_ends[index]]
+
+    def url(self, index):
+        chapter_id = self.ids[index]
+        if chapter_id:
+            return f"{self.URL_PREFIX}{chapter_id}"
+        return self.other_urls[index]
+
+    def chapter_id(self, index):
+        """返回章节 ID，URL 不是标准格式时返回 None"""
+        return self.ids[index] or None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ChapterList.from_pairs((self.title(i), self.url(i)) for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("章节索引超出范围")
+        return {'title': self.title(index), 'url': self.url(index)}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield {'title': self.title(index), 'url': self.url(index)}
+
+    def __eq__(self, other):
+        if isinstance(other, (ChapterList, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"<ChapterList {len(self)} 章>"
+
+    def to_list(self):
+        """转换为 {'title', 'url'} 字典列表 (用于 JSON 序列化)"""
+        return list(self)
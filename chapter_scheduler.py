@@ -0,0 +1,178 @@
+import threading
+from collections import deque
+
+
+class JobCancelled(Exception):
+    """书籍在所有章节交付前被取消 (或调度器已关闭)"""
+    pass
+
+
+class BookJob:
+    """
+    调度器中的一本书：待获取的章节按顺序分发，结果按顺序交付给该书的写入线程。
+    """
+
+    def __init__(self, scheduler, fetch, items, window=None, limit=None):
+        self.scheduler = scheduler
+        self.fetch = fetch
+        self.items = items
+        self.window = window
+        self.limit = limit # 公平份额 (单本书的并发设置)：其他书籍也有章节可领取时，最多同时获取这么多章，None 表示不限
+        self.inflight = 0 # 已分发、尚未获取完成的章节数
+        self.next_pos = 0 # 下一个待分发的位置
+        self.consumed = 0 # 已交付给写入线程的数量
+        self.results = {} # 位置 -> (内容, 异常)
+        self.cancelled = False
+
+    def has_work(self, default_window, within_share=True):
+        """
+        还有章节未分发，且已获取未写入的章节数没有超过窗口。
+        within_share 为真时还要求同时获取的章节数没有达到该书的份额。
+        """
+        window = self.window or default_window
+        if within_share and self.limit and self.inflight >= self.limit:
+            return False
+        return not self.cancelled and self.next_pos < len(self.items) and self.next_pos - self.consumed < window
+
+    def results_in_order(self, poll=None, poll_interval=0.5):
+        """
+        按章节顺序生成 (位置, 内容, 异常)。
+        :param poll: 等待结果期间定期调用 (如检查暂停/停止)，可抛出异常中止
+        任务被取消或调度器关闭时抛出 JobCancelled，避免写入线程把不完整的书当作完成
+        """
+        cond = self.scheduler.cond
+        for pos in range(len(self.items)):
+            while True:
+                with cond:
+                    ready = cond.wait_for(lambda: pos in self.results or self.cancelled, poll_interval)
+                    if self.cancelled:
+                        raise JobCancelled("章节获取已取消")
+                    if ready:
+                        content, error = self.results.pop(pos)
+                        self.consumed = pos + 1
+                        # 窗口腾出空位，唤醒空闲的获取线程
+                        cond.notify_all()
+                        break
+                if poll:
+                    poll()
+            yield pos, content, error
+
+    def cancel(self):
+        """取消尚未分发的章节，正在获取的章节完成后丢弃结果"""
+        with self.scheduler.cond:
+            self.cancelled = True
+            self.results.clear()
+            if self in self.scheduler.jobs:
+                self.scheduler.jobs.remove(self)
+            self.scheduler.cond.notify_all()
+
+
+class ChapterScheduler:
+    """
+    跨书籍的章节级调度器。
+    固定数量的获取线程从所有进行中的书籍里轮流领取章节 (轮询，避免大书独占)，
+    某本书没有可领取的章节时，空闲线程立即转去其他书籍，只要还有书籍有未获取的章节，线程就不会闲置。
+    每本书的 limit 只是公平份额：所有书籍都达到份额后，剩余的空闲线程继续领取仍有章节的书籍，
+    因此小书完成后，空出的线程会转去帮助大书。
+    每本书仍由自己的线程按顺序写入，进度也由该线程单独报告。
+    线程安全。
+    """
+
+    def __init__(self, workers=4):
+        """
+        :param workers: 获取线程数 (所有书籍共享)
+        """
+        self.cond = threading.Condition()
+        self.jobs = deque() # 进行中的书籍，按轮询顺序排列
+        self.target_workers = 0
+        self.threads = []
+        self.closed = False
+        # 出现验证码时关闭闸门，所有获取线程暂停发起新请求
+        self.gate = threading.Event()
+        self.gate.set()
+        self.set_workers(workers)
+
+    def set_workers(self, count):
+        """调整获取线程数，多余的线程在完成当前章节后退出"""
+        with self.cond:
+            self.target_workers = max(1, count)
+            self.threads = [t for t in self.threads if t.is_alive()]
+            while len(self.threads) < self.target_workers:
+                thread = threading.Thread(target=self._run, name=f'chapter-worker-{len(self.threads)}', daemon=True)
+                self.threads.append(thread)
+                thread.start()
+            self.cond.notify_all()
+
+    def submit(self, fetch, items, window=None, limit=None):
+        """
+        登记一本书。
+        :param fetch: fetch(item) 获取单个章节，返回内容，失败时抛出异常
+        :param items: 待获取的章节列表，按写入顺序排列
+        :param window: 该书已获取未写入的章节上限，默认为获取线程数的两倍
+        :param limit: 该书的公平份额 (同时获取的章节数)，其他书籍都已达到份额时可以超出，默认不限
+        返回: BookJob，写入线程通过 results_in_order 按顺序取得结果
+        """
+        job = BookJob(self, fetch, items, window, limit)
+        with self.cond:
+            self.jobs.append(job)
+            self.cond.notify_all()
+        return job
+
+    def close(self):
+        """停止所有获取线程，取消所有书籍"""
+        with self.cond:
+            self.closed = True
+            for job in self.jobs:
+                job.cancelled = True
+            self.jobs.clear()
+            self.cond.notify_all()
+        self.gate.set()
+
+    def _next_task(self):
+        """
+        轮询所有书籍，领取下一个可获取的章节；调用时需持有 cond。
+        先在未达到份额的书籍中轮询，都已达到份额时再把线程分给任意仍有章节的书籍。
+        """
+        default_window = self.target_workers * 2
+        for within_share in (True, False):
+            for _ in range(len(self.jobs)):
+                job = self.jobs[0]
+                self.jobs.rotate(-1)
+                if job.has_work(default_window, within_share):
+                    pos = job.next_pos
+                    job.next_pos += 1
+                    job.inflight += 1
+                    return job, pos
+                if job.next_pos >= len(job.items):
+                    # 所有章节都已分发，不再参与轮询
+                    self.jobs.remove(job)
+        return None
+
+    def _should_exit(self):
+        return self.closed or len(self.threads) > self.target_workers
+
+    def _run(self):
+        me = threading.current_thread()
+        while True:
+            with self.cond:
+                task = None
+                while not self._should_exit():
+                    task = self._next_task()
+                    if task:
+                        break
+                    self.cond.wait()
+                if task is None:
+                    if me in self.threads:
+                        self.threads.remove(me)
+                    return
+            job, pos = task
+            self.gate.wait()
+            try:
+                result = (job.fetch(job.items[pos]), None)
+            except Exception as e:
+                result = (None, e)
+            with self.cond:
+                job.inflight -= 1
+                if not job.cancelled:
+                    job.results[pos] = result
+                self.cond.notify_all()
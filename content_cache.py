@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ContentCache:
+    """
+    磁盘内容缓存，按 URL 保存解码后的章节内容和书籍信息。
+    - 章节内容长期有效，缓存总大小超过上限时按最近最少使用 (LRU) 淘汰
+    - 书籍信息/目录页会更新，读取时超过 book_ttl 秒视为过期
+    同一本书换格式重下、崩溃后重下时，已缓存的章节不再产生网络请求。
+    线程安全。
+    """
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024, book_ttl=600):
+        """
+        :param cache_dir: 缓存目录
+        :param max_bytes: 缓存总大小上限 (字节)
+        :param book_ttl: 书籍信息的有效期 (秒)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.book_ttl = book_ttl
+        self.lock = threading.Lock()
+        self.index = OrderedDict() # key -> 文件大小，按最近使用时间从旧到新排列
+        self.total_bytes = 0
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._load_index()
+        self._evict()
+
+    def _load_index(self):
+        """扫描缓存目录，按文件修改时间重建 LRU 顺序"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                if not fname.endswith('.json'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, fname))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, fname[:-5], stat.st_size))
+        entries.sort()
+        for _, key, size in entries:
+            self.index[key] = size
+            self.total_bytes += size
+
+    def _key(self, namespace, url):
+        return hashlib.sha1(f"{namespace}:{url}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        # 按前两位分目录，避免单个目录下文件过多
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _get(self, namespace, url, ttl=None):
+        key = self._key(namespace, url)
+        with self.lock:
+            if key not in self.index:
+                return None
+            self.index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if ttl is not None and time.time() - entry['time'] > ttl:
+                return None
+            # 更新修改时间，使 LRU 顺序在重启后仍然有效
+            os.utime(path)
+            return entry['data']
+        except Exception:
+            self._discard(key)
+            return None
+
+    def _put(self, namespace, url, data):
+        key = self._key(namespace, url)
+        path = self._path(key)
+        payload = json.dumps({'time': time.time(), 'url': url, 'data': data}, ensure_ascii=False, separators=(',', ':'))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，避免读到写了一半的内容
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        with self.lock:
+            self.total_bytes += size - self.index.pop(key, 0)
+            self.index[key] = size
+        self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目，直到总大小不超过上限"""
+        evicted = []
+        with self.lock:
+            while self.total_bytes > self.max_bytes and len(self.index) > 1:
+                old_key, old_size = self.index.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _discard(self, key):
+        with self.lock:
+            self.total_bytes -= self.index.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def has_chapter(self, url):
+        with self.lock:
+            return self._key('chapter', url) in self.index
+
+    def get_chapter(self, url):
+        """返回缓存的章节内容列表，未命中返回 None"""
+        return self._get('chapter', url)
+
+    def put_chapter(self, url, content):
+        self._put('chapter', url, content)
+
+    def get_book(self, url):
+        """返回未过期的书籍信息，未命中或已过期返回 None"""
+        return self._get('book', url, ttl=self.book_ttl)
+
+    def put_book(self, url, book_info):
+        self._put('book', url, book_info)
@@ -1,15 +1,21 @@
 import uuid
 import os
-from PySide6.QtCore import QObject, Signal, QTimer
+import heapq
+import itertools
+from PySide6.QtCore import QObject, Signal
 from workers import DownloadWorker, BatchDownloadWorker
+from task_journal import TaskJournal
 
 class DownloadTask:
+    _seq = itertools.count()
+
     def __init__(self, task_type, **kwargs):
         self.id = str(uuid.uuid4())
+        self.seq = next(DownloadTask._seq) # 添加顺序，等待队列按此排序
         self.type = task_type # 'single' or 'batch'
-        self.kwargs = kwargs
+        self.kwargs = kwargs # 任务参数，启动时据此创建工作线程
         self.status = 'waiting' # waiting, running, paused, finished, error
-        self.worker = None
+        self.worker = None # 只有已启动且未结束的任务持有工作线程
         self.title = "未知任务"
         self.progress = (0, 0)
         self.status_msg = ""
@@ -43,19 +49,95 @@ class DownloadManager(QObject):
     def __init__(self, downloader):
         super().__init__()
         self.downloader = downloader
-        self.tasks = [] # List of DownloadTask
+        self.tasks = [] # List of DownloadTask，保持添加顺序
+        self.task_map = {} # 任务 ID -> DownloadTask，进度等信号按 ID 直接查找
         self.max_concurrent_tasks = 1 # 默认单线程
         self.verification_active = False # 验证码状态标记
-        self.queue_timer = QTimer()
-        self.queue_timer.timeout.connect(self.process_queue)
-        self.queue_timer.start(1000) # 每秒检查一次队列
+        self.stopping = False # 程序退出中，不再调度新任务
+        # 调度由任务状态变化 (添加、完成、出错、暂停、取消) 触发，不再定时轮询
+        self.ready = [] # 等待中的任务堆 (添加顺序, 任务)，状态已变化的条目在取出时跳过
+        self.running = set() # 运行中的任务 ID
+        self.journal = None # 队列日志，通过 enable_journal 启用
+        # 章节级调度：所有运行中的任务共用一组章节获取线程，
+        # 小书完成后空出的线程继续获取其他书籍的章节
+        self._update_scheduler()
 
     def set_max_concurrent_tasks(self, count):
         self.max_concurrent_tasks = count
+        self._update_scheduler()
         # 设置变更后立即检查队列
         self.process_queue()
 
-    def add_single_task(self, book_url, save_dir, fmt, book_info=None, chapter_indices=None, split_files=False, delay=-1, chapter_limit=0, title=None):
+    def _update_scheduler(self):
+        """
+        章节获取线程数 = 同时下载任务数 × 单本章节并发数 (运行中任务的最大值)，即管理器的总预算。
+        单本的并发数只是公平份额：小书完成后空出的线程继续获取其他书籍 (如剩下的大书) 的章节。
+        """
+        per_task = max((self.task_map[tid].kwargs.get('concurrency', 1) for tid in self.running), default=1)
+        workers = self.max_concurrent_tasks * per_task
+        self.downloader.enable_scheduler(workers)
+        # 连接池大小随获取线程数增长，保证每个线程都能复用连接
+        self.downloader.set_pool_size(max(10, workers * 2))
+
+    def _set_status(self, task, status, journal=True):
+        """
+        修改任务状态，同时维护运行集合、等待队列和队列日志。
+        :param journal: 是否把新状态写入队列日志 (新任务的状态随 journal.add 一起写入)
+        """
+        was_running = task.id in self.running
+        task.status = status
+        if status == 'running':
+            self.running.add(task.id)
+        else:
+            self.running.discard(task.id)
+        if self.stopping:
+            # 程序退出中：下载器和队列日志已关闭，停止的工作线程稍后发出的状态信号不再触及它们
+            return
+        if was_running != (status == 'running'):
+            self._update_scheduler()
+        if status == 'waiting':
+            heapq.heappush(self.ready, (task.seq, task))
+        if self.journal and journal:
+            if status in ('finished', 'cancelled'):
+                self.journal.remove(task.id)
+            else:
+                self.journal.set_status(task.id, status)
+
+    def enable_journal(self, path):
+        """
+        启用队列日志，并恢复上次退出 (或崩溃) 时未完成的任务。
+        恢复的单本任务从本地进度继续下载；运行中的任务恢复为等待，暂停和出错的任务保持原状态。
+        需在界面连接好信号后调用，以便恢复的任务显示在列表中。
+        :param path: 日志数据库文件路径
+        返回: 恢复的任务数
+        """
+        self.journal = TaskJournal(path)
+        records = self.journal.load()
+        for record in records:
+            params = record['params']
+            if record['type'] == 'single':
+                params['resume'] = True
+            task = DownloadTask(record['type'], **params)
+            task.id = record['id']
+            if record['title']:
+                task.title = record['title']
+            task.cover_url = record['cover_url'] or task.cover_url
+            task.progress = (record['current'], record['total'])
+            status = 'waiting' if record['status'] == 'running' else record['status']
+            self._add_task(task, status)
+            if task.progress[1]:
+                self.task_updated.emit(task.id, task.progress[0], task.progress[1], "已从上次进度恢复")
+            if status != 'waiting':
+                self.task_status_changed.emit(task.id, status)
+        self.process_queue()
+        return len(records)
+
+    def set_request_budget(self, rate):
+        """设置所有任务共享的总请求速率 (次/秒)"""
+        self.downloader.set_request_budget(rate)
+
+    def add_single_task(self, book_url, save_dir, fmt, book_info=None, chapter_indices=None, split_files=False, delay=-1, chapter_limit=0, title=None, concurrency=1):
+        # fmt 可以是 'txt'/'md'/'epub'，也可以是它们的列表 (一次获取，同时生成多种格式)
         task = DownloadTask('single', 
                           book_url=book_url, 
                           save_dir=save_dir, 
@@ -65,17 +147,16 @@ class DownloadManager(QObject):
                           split_files=split_files, 
                           delay=delay,
                           chapter_limit=chapter_limit,
-                          title=title)
-        
-        # 初始化 Worker (但不启动)
-        worker = DownloadWorker(self.downloader, book_url, save_dir, fmt, book_info, chapter_indices, split_files, delay, chapter_limit)
-        self._setup_worker(task, worker)
+                          title=title,
+                          concurrency=concurrency)
         
-        self.tasks.append(task)
-        self.task_added.emit(task.id, task.title, task.cover_url)
+        # 工作线程在任务启动时才创建，排队中的任务只保存参数
+        self._add_task(task)
+        self.process_queue()
         return task.id
         
     def add_batch_task(self, rank_url, save_dir, top_n=5, chapters_count=0, fmt='txt', split_files=False, delay=-1):
+        # fmt 与 add_single_task 相同，可以是格式名或格式名列表
         task = DownloadTask('batch',
                            rank_url=rank_url,
                            save_dir=save_dir,
@@ -84,13 +165,39 @@ class DownloadManager(QObject):
                            fmt=fmt,
                            split_files=split_files,
                            delay=delay)
-                           
-        worker = BatchDownloadWorker(self.downloader, rank_url, save_dir, top_n, chapters_count, fmt, split_files, delay)
-        self._setup_worker(task, worker)
         
+        self._add_task(task)
+        self.process_queue()
+        return task.id
+
+    def _add_task(self, task, status='waiting'):
         self.tasks.append(task)
+        self.task_map[task.id] = task
+        self._set_status(task, status, journal=False)
+        # 任务参数和初始状态在同一个事务中写入
+        if self.journal:
+            self.journal.add(task)
         self.task_added.emit(task.id, task.title, task.cover_url)
-        return task.id
+
+    def _create_worker(self, task):
+        """按任务参数创建工作线程"""
+        kw = task.kwargs
+        if task.type == 'single':
+            return DownloadWorker(self.downloader, kw['book_url'], kw['save_dir'], kw['fmt'], kw.get('book_info'), kw['chapter_indices'],
+                                  kw['split_files'], kw['delay'], kw['chapter_limit'], kw['concurrency'], kw.get('resume', False))
+        return BatchDownloadWorker(self.downloader, kw['rank_url'], kw['save_dir'], kw['top_n'], kw['chapters_count'],
+                                   kw['fmt'], kw['split_files'], kw['delay'])
+
+    def _release_worker(self, task):
+        """任务结束 (完成、出错、取消) 后释放工作线程，已获取的书籍信息留给重试使用"""
+        worker = task.worker
+        if worker is None:
+            return
+        task.worker = None
+        if isinstance(worker, DownloadWorker) and worker.book_info:
+            task.kwargs['book_info'] = worker.book_info
+        worker.wait() # run() 发出结束信号后随即返回
+        worker.deleteLater()
 
     def _setup_worker(self, task, worker):
         task.worker = worker
@@ -105,12 +212,18 @@ class DownloadManager(QObject):
         
     def stop_all(self):
         """停止所有任务，用于程序退出"""
-        self.queue_timer.stop()
+        self.stopping = True # 不再调度新任务
         for task in self.tasks:
             if task.worker and task.worker.isRunning():
                 task.worker.stop()
                 if not task.worker.wait(2000): # 等待2秒
                     task.worker.terminate() # 强制终止
+        # 关闭队列日志，被停止的任务保持退出前的状态，下次启动时恢复
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        # 释放连接池
+        self.downloader.close()
 
     def _on_verification_needed(self, task_id, url):
         # 标记验证状态
@@ -153,52 +266,46 @@ class DownloadManager(QObject):
                     task.cover_url = real_cover
                     self.cover_updated.emit(task_id, real_cover)
             
+            if self.journal:
+                self.journal.set_progress(task_id, current, total, task.title, task.cover_url)
             self.task_updated.emit(task_id, current, total, msg)
             
     def _on_worker_finished(self, task_id, filepath):
         task = self.get_task(task_id)
         if task:
-            task.status = 'finished'
+            self._set_status(task, 'finished')
+            self._release_worker(task)
             task.filepath = filepath
             self.task_status_changed.emit(task_id, 'finished')
             self.task_finished.emit(task_id, task.title, filepath, task.cover_url)
             # 自动从运行列表中移除逻辑由 UI 处理，Manager 保留记录直到显式清除
+            # 空出的名额立即交给下一个等待中的任务
+            self.process_queue()
             
     def _on_worker_error(self, task_id, err_msg):
         task = self.get_task(task_id)
         if task:
-            task.status = 'error'
+            self._set_status(task, 'error')
+            self._release_worker(task)
             task.status_msg = err_msg
             self.task_updated.emit(task_id, 0, 0, f"错误: {err_msg}")
             self.task_status_changed.emit(task_id, 'error')
+            self.process_queue()
 
     def get_task(self, task_id):
-        for t in self.tasks:
-            if t.id == task_id:
-                return t
-        return None
+        return self.task_map.get(task_id)
 
     def process_queue(self):
-        # 如果处于验证状态，暂停调度
-        if self.verification_active:
+        """有空闲名额时按添加顺序启动等待中的任务，由任务状态变化触发"""
+        # 如果处于验证状态或程序正在退出，暂停调度
+        if self.verification_active or self.stopping:
             return
 
-        # 1. 检查正在运行的任务数量
-        running_tasks = [t for t in self.tasks if t.status == 'running']
-        running_count = len(running_tasks)
-        
-        # 2. 如果运行数小于最大并发数，调度新任务
-        if running_count < self.max_concurrent_tasks:
-            # 计算还可以启动几个
-            slots_available = self.max_concurrent_tasks - running_count
-            
-            # 查找 'waiting' 任务
-            waiting_tasks = [t for t in self.tasks if t.status == 'waiting']
-            
-            # 启动可用名额的任务
-            for i in range(min(slots_available, len(waiting_tasks))):
-                next_task = waiting_tasks[i]
-                self.start_task(next_task.id)
+        while len(self.running) < self.max_concurrent_tasks and self.ready:
+            _, task = heapq.heappop(self.ready)
+            # 入队后状态已变化 (被暂停、取消或已手动启动) 的条目直接跳过
+            if task.status == 'waiting':
+                self.start_task(task.id)
 
     def start_task(self, task_id):
         task = self.get_task(task_id)
@@ -210,9 +317,13 @@ class DownloadManager(QObject):
         #        self.pause_task(t.id)
 
         if task.status in ['waiting', 'paused', 'error']:
-            task.status = 'running'
+            self._set_status(task, 'running')
             self.task_status_changed.emit(task_id, 'running')
-            if not task.worker.isRunning():
+            if task.worker is None:
+                # 首次启动或出错后重试
+                self._setup_worker(task, self._create_worker(task))
+                task.worker.start()
+            elif not task.worker.isRunning():
                 if task.worker.is_paused:
                      task.worker.resume()
                 else:
@@ -223,20 +334,24 @@ class DownloadManager(QObject):
     def pause_task(self, task_id):
         task = self.get_task(task_id)
         if task and task.status == 'running':
-            task.status = 'paused'
+            self._set_status(task, 'paused')
             task.worker.pause()
             self.task_status_changed.emit(task_id, 'paused')
+            self.process_queue()
 
     def cancel_task(self, task_id):
         task = self.get_task(task_id)
         if task:
-            if task.status == 'running' or task.status == 'paused':
+            if task.worker and (task.status == 'running' or task.status == 'paused'):
                 task.worker.stop()
                 task.worker.wait() # 等待线程结束
             
-            task.status = 'cancelled'
+            self._set_status(task, 'cancelled')
+            self._release_worker(task)
             self.task_removed.emit(task_id)
             self.tasks.remove(task)
+            del self.task_map[task_id]
+            self.process_queue()
 
     # --- 批量操作 ---
     
@@ -244,30 +359,32 @@ class DownloadManager(QObject):
         for t in self.tasks:
             if t.status in ['paused', 'error']:
                 # 将暂停的改为等待，以便队列处理器重新调度
-                t.status = 'waiting'
+                self._set_status(t, 'waiting')
                 self.task_status_changed.emit(t.id, 'waiting')
-        # 如果当前没有运行的，process_queue 会自动启动一个
+        self.process_queue()
 
     def pause_all(self):
-        changed = False
+        # 先暂停等待中的任务，避免暂停运行中的任务时空出的名额又启动新任务
+        for t in self.tasks:
+            if t.status == 'waiting':
+                self._set_status(t, 'paused')
+                self.task_status_changed.emit(t.id, 'paused')
         for t in self.tasks:
             if t.status == 'running':
                 self.pause_task(t.id)
-                changed = True
-            elif t.status == 'waiting':
-                t.status = 'paused'
-                self.task_status_changed.emit(t.id, 'paused')
-                changed = True
 
     def cancel_all(self):
         # 复制列表进行遍历，因为 cancel_task 会修改列表
-        for t in list(self.tasks):
-            if t.status not in ['finished']:
-                self.cancel_task(t.id)
+        # 先取消未运行的任务，避免取消运行中的任务时空出的名额又启动新任务
+        pending = sorted((t for t in self.tasks if t.status not in ['finished']), key=lambda t: t.status == 'running')
+        for t in pending:
+            self.cancel_task(t.id)
 
     def update_task_title(self, task_id, new_title):
         task = self.get_task(task_id)
         if task:
             task.title = new_title
+            if self.journal:
+                self.journal.set_title(task_id, new_title)
             # 触发更新信号，利用已有的机制刷新UI
             self.task_updated.emit(task_id, task.progress[0], task.progress[1], task.status_msg)
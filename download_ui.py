@@ -2,10 +2,12 @@ import os
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                              QPushButton, QListWidget, QListWidgetItem, 
                              QStackedWidget, QProgressBar, QDialog, QFrame,
-                             QScrollArea, QSizePolicy, QSpinBox)
+                             QScrollArea, QSizePolicy, QSpinBox, QDoubleSpinBox)
 from PySide6.QtCore import Qt, Signal, QSize, QThread
 from PySide6.QtGui import QIcon, QFont, QPixmap
+import io
 import requests
+from image_cache import global_image_cache
 
 class ImageLoaderThread(QThread):
     loaded = Signal(QPixmap)
@@ -19,15 +21,23 @@ class ImageLoaderThread(QThread):
             if not self.url:
                 return
             
-            # 简单的文件缓存检查 (可选，这里先只做内存加载)
-            response = requests.get(self.url, timeout=10)
-            if response.status_code == 200:
+            # 与下载器共用图片缓存，同一封面在进程内只下载一次
+            image = global_image_cache.open(self.url, self._download)
+            if image:
+                with image[1] as f:
+                    data = f.read()
                 pixmap = QPixmap()
-                pixmap.loadFromData(response.content)
+                pixmap.loadFromData(data)
                 self.loaded.emit(pixmap)
         except Exception:
             pass
 
+    def _download(self, url):
+        response = requests.get(url, timeout=10)
+        if response.status_code == 200 and response.content:
+            return io.BytesIO(response.content)
+        return None
+
 class DownloadingItemWidget(QWidget):
     # 信号：任务ID, 操作类型 ('pause', 'resume', 'cancel')
     action_triggered = Signal(str, str)
@@ -200,11 +210,15 @@ class DownloadManagerWindow(QWidget):
     cancel_all_signal = Signal()
     clear_finished_signal = Signal()
     max_concurrent_changed = Signal(int)
+    request_budget_changed = Signal(float)
     
     def __init__(self, parent=None):
         super().__init__(parent, Qt.Window)
         self.setWindowTitle("下载任务管理")
         self.resize(800, 600)
+        # 任务 ID -> (列表项, 列表项控件)，进度更新按 ID 直接定位，不再逐行查找
+        self.downloading_items = {}
+        self.finished_items = {}
         
         main_layout = QHBoxLayout(self)
         main_layout.setContentsMargins(0, 0, 0, 0)
@@ -300,6 +314,19 @@ class DownloadManagerWindow(QWidget):
         self.spin_concurrent.setToolTip("设置同时下载的任务数量")
         self.spin_concurrent.valueChanged.connect(self.on_concurrent_changed)
         top_bar.addWidget(self.spin_concurrent)
+
+        # 全局请求速率 (所有任务共享)
+        lbl_budget = QLabel("总速率:")
+        top_bar.addWidget(lbl_budget)
+
+        self.spin_budget = QDoubleSpinBox()
+        self.spin_budget.setRange(0.2, 10.0)
+        self.spin_budget.setSingleStep(0.5)
+        self.spin_budget.setValue(2.0)
+        self.spin_budget.setSuffix(" 次/秒")
+        self.spin_budget.setToolTip("所有下载任务共享的总请求速率上限，调高并发数不会超过该速率")
+        self.spin_budget.valueChanged.connect(self.request_budget_changed.emit)
+        top_bar.addWidget(self.spin_budget)
         
         top_bar.addSpacing(20)
 
@@ -338,7 +365,7 @@ class DownloadManagerWindow(QWidget):
     def on_concurrent_changed(self, value):
         self.max_concurrent_changed.emit(value)
         if value > 1:
-            self.warning_label.setText(f"温馨提示：当前设置为 {value} 线程下载，请注意：并发数越高，触发验证码的几率越大！")
+            self.warning_label.setText(f"温馨提示：当前设置为 {value} 线程下载。所有任务共享“总速率”预算，并发数只用于掩盖网络延迟；若触发验证码，请调低总速率。")
             self.warning_label.setStyleSheet("color: #F56C6C; background-color: #FEF0F0; padding: 8px; border-radius: 4px; border: 1px solid #FDE2E2;")
         else:
             self.warning_label.setText("温馨提示：单线程下载最安全，不易触发验证码。")
@@ -382,43 +409,33 @@ class DownloadManagerWindow(QWidget):
         item.setSizeHint(widget.sizeHint())
         self.list_downloading.addItem(item)
         self.list_downloading.setItemWidget(item, widget)
+        self.downloading_items[task_id] = (item, widget)
         self.update_counts()
         return widget
         
     def remove_downloading_item(self, task_id):
-        for i in range(self.list_downloading.count()):
-            item = self.list_downloading.item(i)
-            widget = self.list_downloading.itemWidget(item)
-            if widget.task_id == task_id:
-                self.list_downloading.takeItem(i)
-                self.update_counts()
-                return
+        entry = self.downloading_items.pop(task_id, None)
+        if entry:
+            self.list_downloading.takeItem(self.list_downloading.row(entry[0]))
+            self.update_counts()
 
     def update_downloading_item(self, task_id, current, total, status_text, title=None):
-        for i in range(self.list_downloading.count()):
-            item = self.list_downloading.item(i)
-            widget = self.list_downloading.itemWidget(item)
-            if widget.task_id == task_id:
-                widget.update_progress(current, total, status_text)
-                if title:
-                    widget.title_label.setText(title)
-                return
+        entry = self.downloading_items.get(task_id)
+        if entry:
+            widget = entry[1]
+            widget.update_progress(current, total, status_text)
+            if title:
+                widget.title_label.setText(title)
 
     def update_downloading_item_status(self, task_id, status):
-        for i in range(self.list_downloading.count()):
-            item = self.list_downloading.item(i)
-            widget = self.list_downloading.itemWidget(item)
-            if widget.task_id == task_id:
-                widget.update_status(status)
-                return
+        entry = self.downloading_items.get(task_id)
+        if entry:
+            entry[1].update_status(status)
 
     def update_downloading_item_cover(self, task_id, cover_url):
-        for i in range(self.list_downloading.count()):
-            item = self.list_downloading.item(i)
-            widget = self.list_downloading.itemWidget(item)
-            if widget.task_id == task_id:
-                widget.load_cover(cover_url)
-                return
+        entry = self.downloading_items.get(task_id)
+        if entry:
+            entry[1].load_cover(cover_url)
 
     def add_finished_item(self, task_id, title, filepath, cover_url=None):
         item = QListWidgetItem(self.list_finished)
@@ -426,20 +443,19 @@ class DownloadManagerWindow(QWidget):
         item.setSizeHint(widget.sizeHint())
         self.list_finished.addItem(item)
         self.list_finished.setItemWidget(item, widget)
+        self.finished_items[task_id] = (item, widget)
         self.update_counts()
         return widget
         
     def remove_finished_item(self, task_id):
-        for i in range(self.list_finished.count()):
-            item = self.list_finished.item(i)
-            widget = self.list_finished.itemWidget(item)
-            if widget.task_id == task_id:
-                self.list_finished.takeItem(i)
-                self.update_counts()
-                return
+        entry = self.finished_items.pop(task_id, None)
+        if entry:
+            self.list_finished.takeItem(self.list_finished.row(entry[0]))
+            self.update_counts()
 
     def clear_finished_items(self):
         self.list_finished.clear()
+        self.finished_items.clear()
         self.update_counts()
         
     def update_counts(self):
@@ -1,21 +1,108 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+from lxml import etree
+import threading
 import time
 import os
 import re
 import json
 import html
 import random
-from ebooklib import epub
+import zipfile
+import hashlib
+import tempfile
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from rate_limiter import AdaptiveRateController, global_limiter
+from content_cache import ContentCache
+from image_cache import global_image_cache
+from chapter_scheduler import ChapterScheduler
+from epub_writer import StreamingEpubWriter
+from progress_manifest import ProgressManifest
+from chapter_list import ChapterList
+from page_classifier import PAGE_CONTENT, PAGE_WAF, PAGE_VIP, PAGE_ERROR, PageStats, classify_page, classify_missing_content
 
 class VerificationError(Exception):
     """当检测到验证码或风控时抛出"""
     pass
 
+class EmptyResponseError(Exception):
+    """服务器正常响应 (200) 但内容为空时抛出，不属于网络错误"""
+    pass
+
+class ChapterFetchError(Exception):
+    """章节获取失败（已按退避策略重试）时抛出"""
+    pass
+
+def _class_xpath(name, suffix=''):
+    """生成等价于 CSS 类选择器 .name 的 XPath，suffix 为后续路径"""
+    return etree.XPath(f'//*[contains(concat(" ", normalize-space(@class), " "), " {name} ")]{suffix}')
+
+# 章节正文节点，等价于 CSS 选择器 .muye-reader-content / .muye-reader-content-16
+CONTENT_XPATH = _class_xpath('muye-reader-content')
+CONTENT_XPATH_16 = _class_xpath('muye-reader-content-16')
+# 与 BeautifulSoup 的 get_text 一致，不提取这些标签内的文字
+SKIP_TEXT_TAGS = {'script', 'style', 'template'}
+# 这些标签内的空白原样保留
+PRESERVE_WS_TAGS = {'pre', 'textarea'}
+
+# 书籍详情页解析用的预编译规则
+BOOK_TITLE_XPATH = _class_xpath('info-name', '//h1')
+BOOK_H1_XPATH = etree.XPath('//h1')
+BOOK_AUTHOR_XPATH = _class_xpath('author-name-text')
+BOOK_INTRO_XPATH = _class_xpath('page-abstract-content')
+CHAPTER_ITEM_XPATH = _class_xpath('chapter-item', '//a')
+CHAPTER_LIST_XPATH = _class_xpath('chapter-list', '//a')
+COVER_IMG_XPATH = _class_xpath('book-cover-img')
+COVER_BOOK_IMG_XPATH = _class_xpath('book-img', '//img')
+COVER_HEADER_IMG_XPATH = _class_xpath('page-header-left', '//img')
+NOVEL_PIC_PATTERN = re.compile(r'https?://[^"\'\s]+novel-pic[^"\'\s]+')
+
+# 排行榜解析用的预编译规则
+RANK_TITLE_TAGS = ('h1', 'h2', 'h3', 'h4', 'div', 'span') # 书名标签，按优先级排列
+RANK_TITLE_CLASS = re.compile(r'name|title')
+CJK_PATTERN = re.compile('[\u4e00-\u9fff]')
+RANK_STATUS_PATTERN = re.compile(r'(连载中|已完结)')
+RANK_READING_PATTERN = re.compile(r'在读[:：]?\s*([\d\.万]+)')
+RANK_DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2}(?:\s+\d{2}:\d{2})?)')
+
+# 图片流式下载：分块大小，以及超过多少字节后从内存转存到临时文件
+IMAGE_CHUNK_BYTES = 64 * 1024
+IMAGE_SPOOL_BYTES = 1024 * 1024
+# EPUB 图片预取线程数
+IMAGE_PREFETCH_WORKERS = 4
+# EPUB 中按内容哈希命名的图片 (img_<sha1>.<ext>)
+EPUB_SHARED_IMAGE_PATTERN = re.compile(rb'src="(img_[0-9a-f]{40}\.\w+)"')
+
+
+def _html_root(page):
+    """
+    解析 HTML 页面为 lxml 元素树，页面为空时返回 None。
+    page 可以是响应原始字节 (按 UTF-8 直接交给 libxml2，不再先解码成 str) 或 str。
+    """
+    if not page or page.isspace():
+        return None
+    return etree.fromstring(page, etree.HTMLParser(huge_tree=True, encoding='utf-8'))
+
+
+def _soup(page):
+    """创建 BeautifulSoup 对象，bytes 按 UTF-8 解析"""
+    return BeautifulSoup(page, 'lxml', from_encoding='utf-8' if isinstance(page, bytes) else None)
+
 # --- 策略模式：格式化器 ---
 
 class BookFormatter(ABC):
+    # 是否支持分章保存 (每章一个文件)
+    supports_split = True
+    # 输出文件扩展名，用于进度清单文件名；为 None 的格式不写进度清单
+    extension = None
+
+    def __init__(self):
+        self._manifest_cache = {} # 清单路径 -> 已读取的记录，一次 save_book 内只读取一次
+
     @abstractmethod
     def detect_existing_progress(self, book_data, save_dir, split_files):
         """
@@ -47,6 +134,141 @@ class BookFormatter(ABC):
         """
         pass
     
+    def supports_out_of_order(self, context):
+        """
+        是否允许章节不按顺序写入。
+        单文件输出只能顺序追加，补回的失败章节需要与后续章节一起按顺序写入。
+        """
+        return False
+
+    def prefetch(self, context, content, index):
+        """
+        章节内容获取完成、尚未写入时调用 (可能在获取线程中)，
+        需要额外下载资源的格式 (如 EPUB 图片) 可提前开始下载。默认不处理。
+        """
+        pass
+
+    def detect_existing_chapters(self, book_data, save_dir, split_files):
+        """
+        检测本地已有的章节。
+        返回: 已下载章节索引的集合。默认视为第一章到已下载的最后一章都已存在；
+        能识别缺章的格式 (如 EPUB) 可覆盖此方法，只补下缺失的章节。
+        """
+        chapters = self._detect_from_manifest(book_data, save_dir, split_files)
+        if chapters is not None:
+            return chapters
+        return set(range(self.detect_existing_progress(book_data, save_dir, split_files) + 1))
+
+    def appends_in_order(self, split_files):
+        """
+        输出是否只能按章节顺序追加 (单文件 TXT/MD)。
+        这类格式续写时，已有章节之前缺少的章节无法插入，需要从缺章处重写。
+        """
+        return not split_files
+
+    def abort(self, context):
+        """下载出错或被取消时释放资源 (如关闭文件句柄)"""
+        if 'file_handle' in context:
+            context['file_handle'].close()
+        if 'manifest' in context:
+            context['manifest'].close()
+
+    def _manifest(self, save_dir, book_data, split_files):
+        """进度清单：单文件放在输出文件旁，分章保存时放在书籍目录内"""
+        if split_files:
+            return ProgressManifest(os.path.join(save_dir, book_data['title'], f".progress.{self.extension}.jsonl"))
+        return ProgressManifest(f"{self.get_final_path(save_dir, book_data, split_files)}.progress.jsonl")
+
+    def _detect_from_manifest(self, book_data, save_dir, split_files):
+        """
+        根据进度清单检测已下载的章节，按章节 URL 精确匹配。
+        返回: 已下载章节索引的集合；没有清单或清单与输出文件不一致时返回 None (回退到扫描输出文件)
+        """
+        if self.extension is None:
+            return None
+        manifest = self._manifest(save_dir, book_data, split_files)
+        if not manifest.exists():
+            return None
+        chapters = book_data['chapters']
+
+        if split_files:
+            # 每章独立成文件，缺失的章节可以单独补全
+            return {r['i'] for r in self._load_manifest(manifest)
+                    if 0 <= r.get('i', -1) < len(chapters) and chapters[r['i']].get('url') == r.get('url')}
+
+        # 单文件按章节顺序追加：只认连续写入的部分，缺章 (获取失败被跳过的章节) 及之后的内容续写时重写
+        records = self._continuous_records(self._load_manifest(manifest), chapters)
+        if not records:
+            return None
+        last = records[-1]
+        try:
+            if os.path.getsize(self.get_final_path(save_dir, book_data, split_files)) < last['offset'] + last['length']:
+                return None # 输出文件被截断或替换过
+        except OSError:
+            return None
+        return {r['i'] for r in records}
+
+    def _load_manifest(self, manifest):
+        """读取进度清单的全部记录，同一次下载中重复检测时复用"""
+        if manifest.path not in self._manifest_cache:
+            self._manifest_cache[manifest.path] = manifest.load()
+        return self._manifest_cache[manifest.path]
+
+    def clear_manifest_cache(self):
+        """丢弃已读取的进度清单，save_book 开始时调用，保证每次下载按磁盘上的最新清单检测"""
+        self._manifest_cache.clear()
+
+    def _continuous_records(self, records, chapters):
+        """单文件清单中从头开始、章节索引连续且与目录一致的记录"""
+        result = []
+        for r in records:
+            i = r.get('i', -1)
+            if not 0 <= i < len(chapters) or chapters[i].get('url') != r.get('url'):
+                break
+            if result and i != result[-1]['i'] + 1:
+                break
+            result.append(r)
+        return result
+
+    def _open_manifest(self, context, book_data, save_dir, split_files, append_mode):
+        """
+        打开进度清单，需在打开单文件输出之前、创建分章目录之后调用。
+        追加到清单无法识别的旧文件时，分章目录中已有的章节会先补登到清单。
+        """
+        manifest = self._manifest(save_dir, book_data, split_files)
+        if append_mode and self._detect_from_manifest(book_data, save_dir, split_files) is not None:
+            if not split_files:
+                # 输出文件中连续部分之后的内容 (崩溃时写了一半的章节，或缺章之后的章节) 截掉后再续写
+                records = self._load_manifest(manifest)
+                kept = self._continuous_records(records, book_data['chapters'])
+                if len(kept) < len(records):
+                    manifest.rewrite(kept)
+                last = kept[-1]
+                end = last['offset'] + last['length']
+                filepath = self.get_final_path(save_dir, book_data, split_files)
+                if os.path.getsize(filepath) > end:
+                    with open(filepath, 'rb+') as f:
+                        f.truncate(end)
+            manifest.open(append=True)
+            # 之后会继续追加记录，缓存的内容不再有效
+            self._manifest_cache.pop(manifest.path, None)
+        else:
+            manifest.open(append=False)
+            if append_mode and split_files:
+                pattern = re.compile(r'^(\d{3})_.*\.' + self.extension + '$')
+                for fname in sorted(os.listdir(context['target_dir'])):
+                    match = pattern.match(fname)
+                    idx = int(match.group(1)) - 1 if match else -1
+                    if 0 <= idx < len(book_data['chapters']):
+                        manifest.record(i=idx, url=book_data['chapters'][idx].get('url'), title=book_data['chapters'][idx]['title'],
+                                        file=fname, length=os.path.getsize(os.path.join(context['target_dir'], fname)))
+        context['manifest'] = manifest
+
+    def _record_chapter(self, context, chapter_data, index, text, **fields):
+        """章节写入完成后追加一条进度记录"""
+        context['manifest'].record(i=index, url=chapter_data.get('url'), title=chapter_data['title'],
+                                   sha1=hashlib.sha1(text.encode('utf-8')).hexdigest(), **fields)
+
     def get_final_path(self, save_dir, book_data, split_files):
         """获取最终文件路径，用于跳过下载时返回"""
         if split_files:
@@ -55,8 +277,22 @@ class BookFormatter(ABC):
             # 默认实现，子类可覆盖
             return os.path.join(save_dir, f"{book_data['title']}.txt")
 
+    def finish_existing(self, save_dir, book_data, split_files):
+        """
+        本地已有全部所需章节、跳过生成时调用。
+        返回: 已有输出的路径；需要收尾的格式 (如 EPUB 的未完成文件) 可覆盖此方法
+        """
+        return self.get_final_path(save_dir, book_data, split_files)
+
 class TxtFormatter(BookFormatter):
+    extension = 'txt'
+
     def detect_existing_progress(self, book_data, save_dir, split_files):
+        # 优先使用进度清单，没有清单的旧文件再扫描输出内容
+        chapters = self._detect_from_manifest(book_data, save_dir, split_files)
+        if chapters is not None:
+            return max(chapters) if chapters else -1
+
         last_index = -1
         
         if split_files:
@@ -107,6 +343,7 @@ class TxtFormatter(BookFormatter):
             if not os.path.exists(book_folder):
                 os.makedirs(book_folder)
             context['target_dir'] = book_folder
+            self._open_manifest(context, book_data, save_dir, split_files, append_mode)
             
             # 如果不是追加模式，或者简介不存在，则写入简介
             intro_path = os.path.join(book_folder, "000_简介.txt")
@@ -123,6 +360,7 @@ class TxtFormatter(BookFormatter):
             filename = f"{book_data['title']}.txt"
             filepath = os.path.join(save_dir, filename)
             mode = 'a' if append_mode else 'w'
+            self._open_manifest(context, book_data, save_dir, split_files, append_mode)
             f = open(filepath, mode, encoding='utf-8')
             
             if not append_mode:
@@ -164,13 +402,22 @@ class TxtFormatter(BookFormatter):
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write(text_content)
             context['files_created'].append(filepath)
+            self._record_chapter(context, chapter_data, index, text_content, file=filename, length=os.path.getsize(filepath))
         else:
             # 单文件
             f = context['file_handle']
+            offset = f.tell()
             f.write(f"\n\n=== {chapter_data['title']} ===\n\n")
             f.write(text_content)
+            f.flush()
+            self._record_chapter(context, chapter_data, index, text_content, offset=offset, length=f.tell() - offset)
+
+    def supports_out_of_order(self, context):
+        # 分章保存时每章独立成文件，可以乱序写入
+        return context['split_files']
 
     def finalize(self, context):
+        context['manifest'].close()
         if context['split_files']:
             return context['target_dir']
         else:
@@ -178,7 +425,14 @@ class TxtFormatter(BookFormatter):
             return context['filepath']
 
 class MdFormatter(BookFormatter):
+    extension = 'md'
+
     def detect_existing_progress(self, book_data, save_dir, split_files):
+        # 优先使用进度清单，没有清单的旧文件再扫描输出内容
+        chapters = self._detect_from_manifest(book_data, save_dir, split_files)
+        if chapters is not None:
+            return max(chapters) if chapters else -1
+
         last_index = -1
         if split_files:
             book_folder = os.path.join(save_dir, book_data['title'])
@@ -212,6 +466,11 @@ class MdFormatter(BookFormatter):
                     pass
         return last_index
 
+    def get_final_path(self, save_dir, book_data, split_files):
+        if split_files:
+            return os.path.join(save_dir, book_data['title'])
+        return os.path.join(save_dir, f"{book_data['title']}.md")
+
     def initialize(self, book_data, save_dir, split_files, append_mode=False, downloader=None):
         context = {
             'downloader': downloader,
@@ -226,6 +485,7 @@ class MdFormatter(BookFormatter):
             if not os.path.exists(book_folder):
                 os.makedirs(book_folder)
             context['target_dir'] = book_folder
+            self._open_manifest(context, book_data, save_dir, split_files, append_mode)
             
             intro_path = os.path.join(book_folder, "000_简介.md")
             if not append_mode or not os.path.exists(intro_path):
@@ -240,6 +500,7 @@ class MdFormatter(BookFormatter):
             filename = f"{book_data['title']}.md"
             filepath = os.path.join(save_dir, filename)
             mode = 'a' if append_mode else 'w'
+            self._open_manifest(context, book_data, save_dir, split_files, append_mode)
             f = open(filepath, mode, encoding='utf-8')
             
             if not append_mode:
@@ -281,27 +542,160 @@ class MdFormatter(BookFormatter):
                 f.write(f"# {chapter_data['title']}\n\n")
                 f.write(text_content)
             context['files_created'].append(filepath)
+            self._record_chapter(context, chapter_data, index, text_content, file=filename, length=os.path.getsize(filepath))
         else:
             f = context['file_handle']
+            offset = f.tell()
             f.write(f"## {chapter_data['title']}\n\n")
             f.write(text_content)
             f.write("\n\n")
+            f.flush()
+            self._record_chapter(context, chapter_data, index, text_content, offset=offset, length=f.tell() - offset)
+
+    def supports_out_of_order(self, context):
+        # 分章保存时每章独立成文件，可以乱序写入
+        return context['split_files']
 
     def finalize(self, context):
+        context['manifest'].close()
         if context['split_files']:
             return context['target_dir']
         else:
             context['file_handle'].close()
             return context['filepath']
 
+class ImagePrefetcher:
+    """
+    EPUB 图片预取：用有界线程池并发下载章节中的图片，写入时按原顺序取用。
+    章节获取完成后即可提交，图片下载与后续章节的获取、写入同时进行。
+    线程安全。
+    """
+
+    def __init__(self, downloader, workers=IMAGE_PREFETCH_WORKERS):
+        self.downloader = downloader
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-fetch')
+        self.lock = threading.Lock()
+        self.futures = {} # (章节索引, 图片 URL) -> future 队列 (同一章可能多次引用同一图片)
+        self.submitted = set() # 已提交的章节索引，同一章只提交一次
+        self.closed = False
+
+    def prefetch(self, index, content):
+        """提交一章中全部图片的下载"""
+        if isinstance(content, str):
+            return
+        with self.lock:
+            if self.closed or index in self.submitted:
+                return
+            self.submitted.add(index)
+            for item in content:
+                if item['type'] == 'image':
+                    future = self.executor.submit(self.downloader.fetch_image, item['data'])
+                    self.futures.setdefault((index, item['data']), deque()).append(future)
+
+    def take(self, index, url):
+        """
+        取出图片，等待下载完成；没有预取过的图片直接下载。
+        返回: (内容哈希, 文件对象)，调用方负责关闭文件；下载失败返回 None
+        """
+        with self.lock:
+            queue = self.futures.get((index, url))
+            future = queue.popleft() if queue else None
+            if queue is not None and not queue:
+                del self.futures[(index, url)]
+        if future is None:
+            return self.downloader.fetch_image(url)
+        return future.result()
+
+    def close(self):
+        """停止预取，释放已下载但未取用的图片"""
+        with self.lock:
+            self.closed = True
+            futures = [future for queue in self.futures.values() for future in queue]
+            self.futures.clear()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures:
+            if not future.cancelled():
+                image = future.result()
+                if image:
+                    image[1].close()
+
 class EpubFormatter(BookFormatter):
+    supports_split = False
+
+    def get_final_path(self, save_dir, book_data, split_files):
+        return os.path.join(save_dir, f"{book_data['title']}.epub")
+
+    def get_partial_path(self, save_dir, book_data):
+        """下载中断时已写入的章节保存在这里，下载完成后才生成正式文件"""
+        return self.get_final_path(save_dir, book_data, False) + '.part'
+
     def detect_existing_progress(self, book_data, save_dir, split_files):
-        return -1
+        chapters = self.detect_existing_chapters(book_data, save_dir, split_files)
+        return max(chapters) if chapters else -1
+
+    def finish_existing(self, save_dir, book_data, split_files):
+        partial_path = self.get_partial_path(save_dir, book_data)
+        final_path = self.get_final_path(save_dir, book_data, split_files)
+        if not os.path.exists(partial_path):
+            return final_path
+        existing = self._scan_existing(book_data, save_dir)
+        if existing and len(existing['chapters']) >= len(book_data['chapters']):
+            # 中断时恰好已写完全部章节，未完成文件就是完整的书
+            os.replace(partial_path, final_path)
+            return final_path
+        # 只下载了部分章节，保留为未完成文件
+        return partial_path
+
+    def detect_existing_chapters(self, book_data, save_dir, split_files):
+        existing = self._scan_existing(book_data, save_dir)
+        return set(existing['chapters']) if existing else set()
+
+    def appends_in_order(self, split_files):
+        # 章节在 finalize 时按索引排序，缺章可以直接补入
+        return False
+
+    def _scan_existing(self, book_data, save_dir):
+        """
+        读取已有 EPUB 的目录，上次中断留下的未完成文件优先 (其中已包含正式文件的全部章节)。
+        返回: {'path', 'identifier', 'cover', 'chapters': {章节索引: 文件名}}，文件不存在或无法解析时返回 None
+        """
+        filepath = self.get_partial_path(save_dir, book_data)
+        partial = os.path.exists(filepath)
+        if not partial:
+            filepath = self.get_final_path(save_dir, book_data, False)
+            if not os.path.exists(filepath):
+                return None
+        try:
+            with zipfile.ZipFile(filepath) as z:
+                names = set(z.namelist())
+                nav = z.read('EPUB/nav.xhtml').decode('utf-8')
+                opf = z.read('EPUB/content.opf').decode('utf-8')
+        except Exception as e:
+            print(f"读取已有 EPUB 失败: {e}")
+            return None
+
+        chapters = {}
+        total = len(book_data['chapters'])
+        for file_name, num, title in re.findall(r'<a href="(chap_(\d+)\.xhtml)">(.*?)</a>', nav, re.S):
+            idx = int(num) - 1
+            # 只复用标题与当前目录一致的章节，改名或顺序变动的章节重新获取
+            if idx < total and f'EPUB/{file_name}' in names and html.unescape(title.strip()) == book_data['chapters'][idx]['title']:
+                chapters[idx] = file_name
+
+        identifier = re.search(r'<dc:identifier[^>]*>(.*?)</dc:identifier>', opf, re.S)
+        cover = re.search(r'<item href="([^"]+)" id="cover-img"', opf)
+        return {
+            'path': filepath,
+            'identifier': html.unescape(identifier.group(1)) if identifier else None,
+            'cover': cover.group(1) if cover and f'EPUB/{cover.group(1)}' in names else None,
+            'chapters': chapters
+        }
 
     def initialize(self, book_data, save_dir, split_files, append_mode=False, downloader=None):
         # EPUB 忽略 split_files
-        book = epub.EpubBook()
-
+        # 追加模式下复用已有 EPUB 中的章节、图片和封面，只写入新获取的章节
+        existing = self._scan_existing(book_data, save_dir) if append_mode else None
+        
         # 定义 CSS 样式
         style = '''
         @font-face {
@@ -409,160 +803,212 @@ class EpubFormatter(BookFormatter):
             background-color: #fafafa;
         }
         '''
-        nav_css = epub.EpubItem(uid="style_nav", file_name="style/nav.css", media_type="text/css", content=style)
-        book.add_item(nav_css)
-
-        # 设置封面
-        if book_data.get('cover_url') and downloader:
-            try:
-                cover_data = downloader.get_image_content(book_data['cover_url'])
-                if cover_data:
-                    # 获取扩展名
-                    ext = 'jpg'
-                    if '.png' in book_data['cover_url']: ext = 'png'
-                    elif '.gif' in book_data['cover_url']: ext = 'gif'
-                    
-                    book.set_cover(f"cover.{ext}", cover_data)
-            except Exception as e:
-                print(f"设置封面失败: {e}")
+        filepath = self.get_final_path(save_dir, book_data, split_files)
+        writer = StreamingEpubWriter(
+            filepath,
+            book_data['title'],
+            book_data['author'],
+            identifier=existing['identifier'] if existing else None,
+            description=book_data.get('introduction', '')
+        )
+        writer.add_item('style_nav', 'style/nav.css', style, 'text/css')
+        context = {
+            'downloader': downloader,
+            'writer': writer,
+            'chapters': [], # (章节索引, 文件名, 标题)，内容已写入 zip，只保留目录信息
+            'image_count': 0,
+            'image_files': {}, # 图片内容哈希 -> 文件名，同一图片在书中只保存一份
+            'images': None, # ImagePrefetcher，初始化完成后创建
+            'partial_path': self.get_partial_path(save_dir, book_data)
+        }
 
-        book.set_identifier(f'fanqie-{int(time.time())}')
-        book.set_title(book_data['title'])
-        book.set_language('zh')
-        book.add_author(book_data['author'])
-        book.add_metadata('DC', 'description', book_data.get('introduction', ''))
-        
-        spine = []
-        toc = []
-        
-        # 简介 (美化版)
-        intro_text = book_data.get('introduction', '')
-        intro_content = html.escape(intro_text).replace('\n', '<br/>')
-        intro_html = f'''
+        source = None
+        try:
+            if existing:
+                source = zipfile.ZipFile(existing['path'])
+
+            # 设置封面
+            if existing and existing['cover']:
+                with source.open(f"EPUB/{existing['cover']}") as cover_data:
+                    writer.set_cover(existing['cover'], cover_data)
+            elif book_data.get('cover_url') and downloader:
+                try:
+                    cover = downloader.fetch_image(book_data['cover_url'])
+                    if cover:
+                        # 获取扩展名
+                        ext = 'jpg'
+                        if '.png' in book_data['cover_url']: ext = 'png'
+                        elif '.gif' in book_data['cover_url']: ext = 'gif'
+                        
+                        with cover[1] as cover_data:
+                            writer.set_cover(f"cover.{ext}", cover_data)
+                except Exception as e:
+                    print(f"设置封面失败: {e}")
+            
+            # 简介 (美化版)
+            intro_text = book_data.get('introduction', '')
+            intro_content = html.escape(intro_text).replace('\n', '<br/>')
+            intro_html = f'''
         <div class="intro-page">
             <div class="intro-title">{html.escape(book_data['title'])}</div>
             <div class="intro-info">作者：{html.escape(book_data['author'])}</div>
-            <hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;">
+            <hr style="border: 0; border-top: 1px solid #eee; margin: 15px 0;"/>
             <div class="intro-content">{intro_content}</div>
         </div>
         '''
-        c_intro = epub.EpubHtml(title='书籍信息', file_name='intro.xhtml', lang='zh')
-        c_intro.content = intro_html
-        c_intro.add_item(nav_css) # 引用样式
-        
-        book.add_item(c_intro)
-        spine.append(c_intro)
-        toc.append(c_intro)
-        
-        return {
-            'downloader': downloader,
-            'book': book,
-            'spine': spine,
-            'toc': toc,
-            'save_dir': save_dir,
-            'title': book_data['title'],
-            'css': nav_css
-        }
+            writer.add_page('intro', 'intro.xhtml', '书籍信息', intro_html, 'style/nav.css')
+
+            if existing:
+                self._copy_existing_chapters(context, source, existing['chapters'], book_data)
+        except Exception:
+            writer.abort()
+            raise
+        finally:
+            if source:
+                source.close()
+
+        if downloader:
+            context['images'] = ImagePrefetcher(downloader)
+        return context
+
+    def _copy_existing_chapters(self, context, source, chapters, book_data):
+        """把已有 EPUB 中的章节页面及其图片逐个复制到新容器"""
+        writer = context['writer']
+        images = {} # 章节序号 -> 图片文件名列表 (旧版按章节命名的图片)
+        names = set(source.namelist())
+        for name in source.namelist():
+            match = re.match(r'^EPUB/(img_(\d+)_\d+\.\w+)$', name)
+            if match:
+                images.setdefault(int(match.group(2)), []).append(match.group(1))
+
+        for index, file_name in sorted(chapters.items()):
+            page = source.read(f'EPUB/{file_name}')
+            # 按内容哈希命名的图片可能被多个章节引用，只复制保留章节引用到的
+            shared = [name.decode('ascii') for name in EPUB_SHARED_IMAGE_PATTERN.findall(page)]
+            shared = [name for name in shared if f'EPUB/{name}' in names]
+            for img_filename in images.get(index + 1, []) + shared:
+                if img_filename not in writer.hrefs:
+                    with source.open(f'EPUB/{img_filename}') as img_data:
+                        writer.add_image(f"image_{context['image_count']}", img_filename, img_data)
+                    context['image_count'] += 1
+            for img_filename in shared:
+                # 文件名中的哈希即图片内容哈希，续写时遇到同一图片直接引用
+                context['image_files'][img_filename[4:44]] = img_filename
+            writer.add_item(f'chapter_{index+1}', file_name, page, 'application/xhtml+xml')
+            context['chapters'].append((index, file_name, book_data['chapters'][index]['title']))
+
+    def prefetch(self, context, content, index):
+        if context['images']:
+            context['images'].prefetch(index, content)
 
     def write_chapter(self, context, chapter_data, content, index):
+        writer = context['writer']
         html_parts = []
         
         if isinstance(content, str):
             html_parts = [f"<p>{html.escape(line)}</p>" for line in content.split('\n\n')]
         else:
-            img_idx = 0
+            # 本章图片并发下载 (已在获取阶段提交的不会重复提交)，下面按原顺序取用
+            self.prefetch(context, content, index)
             for item in content:
                 if item['type'] == 'text':
                     html_parts.append(f"<p>{html.escape(item['data'])}</p>")
                 elif item['type'] == 'image':
                     img_url = item['data']
-                    if context.get('downloader'):
-                        img_data = context['downloader'].get_image_content(img_url)
-                        if img_data:
-                            # Determine extension
-                            ext = 'jpg'
-                            if '.png' in img_url: ext = 'png'
-                            elif '.gif' in img_url: ext = 'gif'
-                            elif '.webp' in img_url: ext = 'webp'
-                            elif '.jpeg' in img_url: ext = 'jpg'
-                            
-                            img_filename = f"img_{index+1}_{img_idx}.{ext}"
+                    if context['images']:
+                        image = context['images'].take(index, img_url)
+                        if image:
+                            digest, img_data = image
+                            with img_data:
+                                # 按内容哈希命名，书中重复出现的图片只保存一份
+                                img_filename = context['image_files'].get(digest)
+                                if img_filename is None:
+                                    # Determine extension
+                                    ext = 'jpg'
+                                    if '.png' in img_url: ext = 'png'
+                                    elif '.gif' in img_url: ext = 'gif'
+                                    elif '.webp' in img_url: ext = 'webp'
+                                    elif '.jpeg' in img_url: ext = 'jpg'
+
+                                    img_filename = f"img_{digest}.{ext}"
+                                    writer.add_image(f"image_{context['image_count']}", img_filename, img_data)
+                                    context['image_count'] += 1
+                                    context['image_files'][digest] = img_filename
                             
-                            # Create EpubImage
-                            epub_img = epub.EpubImage()
-                            epub_img.file_name = img_filename
-                            epub_img.media_type = f'image/{ext}'
-                            epub_img.content = img_data
-                            
-                            # Add to book
-                            context['book'].add_item(epub_img)
-                            
-                            html_parts.append(f'<img src="{img_filename}" alt="image" />')
-                            img_idx += 1
+                            html_parts.append(f'<img src="{img_filename}" alt="image"/>')
                         else:
                             html_parts.append(f'<p>[图片下载失败: {html.escape(img_url)}]</p>')
                     else:
                         html_parts.append(f'<p>[图片: {html.escape(img_url)}]</p>')
 
         html_content = "".join(html_parts)
-        c = epub.EpubHtml(title=chapter_data['title'], file_name=f'chap_{index+1}.xhtml', lang='zh')
-        c.content = f'<h1>{html.escape(chapter_data["title"])}</h1>{html_content}'
-        c.add_item(context['css']) # 引用样式
-        
-        context['book'].add_item(c)
-        context['spine'].append(c)
-        context['toc'].append(c)
+        file_name = f'chap_{index+1}.xhtml'
+        writer.add_page(f'chapter_{index+1}', file_name, chapter_data['title'],
+                        f'<h1>{html.escape(chapter_data["title"])}</h1>{html_content}', 'style/nav.css')
+        context['chapters'].append((index, file_name, chapter_data['title']))
+
+    def supports_out_of_order(self, context):
+        # 章节在 finalize 时按索引排序后再生成 spine/目录
+        return True
 
     def finalize(self, context):
-        book = context['book']
-        book.toc = context['toc']
-        book.add_item(epub.EpubNcx())
+        filepath = self._close(context)
+        # 完整文件已生成，上次中断留下的未完成文件不再需要
+        if os.path.exists(context['partial_path']):
+            os.remove(context['partial_path'])
+        return filepath
+
+    def _close(self, context, filepath=None):
+        """生成目录并关闭 EPUB，filepath 为空时保存为正式文件"""
+        writer = context['writer']
+        if context['images']:
+            context['images'].close()
+        chapters = sorted(context['chapters'])
         
         # 生成自定义目录页 (HTML)
         toc_html_parts = [
             '<div class="toc-page">',
             '<div class="toc-title">目录</div>',
-            '<ul class="toc-list">'
+            '<ul class="toc-list">',
+            '<li class="toc-item"><a href="intro.xhtml">书籍信息</a></li>'
         ]
         
-        for item in context['toc']:
-            # item 是 EpubHtml 对象
-            link = item.file_name
-            title = item.title
-            toc_html_parts.append(f'<li class="toc-item"><a href="{link}">{html.escape(title)}</a></li>')
+        for _, file_name, title in chapters:
+            toc_html_parts.append(f'<li class="toc-item"><a href="{file_name}">{html.escape(title)}</a></li>')
             
         toc_html_parts.append('</ul></div>')
+        writer.add_page('toc', 'toc.xhtml', '目录', "\n".join(toc_html_parts), 'style/nav.css')
         
-        c_toc = epub.EpubHtml(title='目录', file_name='toc.xhtml', lang='zh')
-        c_toc.content = "\n".join(toc_html_parts)
-        c_toc.add_item(context['css'])
-        
-        # 添加到书籍项目
-        book.add_item(c_toc)
-        
-        # 调整 Spine 顺序: 插入到 Intro 之后 (index 1)
-        # 假设 context['spine'] 的第一个是 Intro
-        if len(context['spine']) > 0:
-            context['spine'].insert(1, c_toc)
-        else:
-            context['spine'].append(c_toc)
-        
-        # 添加标准的 Nav 文件 (用于阅读器导航菜单，但不放入 linear spine)
-        nav = epub.EpubNav()
-        book.add_item(nav)
-        
-        # 设置 Spine
-        book.spine = context['spine']
-        
-        filename = f"{context['title']}.epub"
-        filepath = os.path.join(context['save_dir'], filename)
-        epub.write_epub(filepath, book)
-        return filepath
+        # Spine 顺序: 简介、目录页、正文 (导航文件不放入 linear spine)
+        spine = ['intro', 'toc'] + [f'chapter_{index+1}' for index, _, _ in chapters]
+        toc = [('intro.xhtml', '书籍信息')] + [(file_name, title) for _, file_name, title in chapters]
+        return writer.close(spine, toc, filepath)
+
+    def abort(self, context):
+        if context['images']:
+            context['images'].close()
+        if context['writer'].closed:
+            return
+        # 已写入的章节保存为未完成文件 (.epub.part)，不覆盖正式文件，下次下载时从缺失的章节续传
+        if context['chapters']:
+            try:
+                self._close(context, context['partial_path'])
+                return
+            except Exception as e:
+                print(f"保存未完成的 EPUB 失败: {e}")
+        context['writer'].abort()
+
+# 格式名 -> 格式化器
+FORMATTERS = {
+    'txt': TxtFormatter,
+    'md': MdFormatter,
+    'epub': EpubFormatter,
+}
 
 # --- 主下载器类 ---
 
 class FanqieDownloader:
-    def __init__(self, cookies=None):
+    def __init__(self, cookies=None, pool_size=10, limiter=None, image_cache=None):
         self.headers = {}
         
         # 生成高熵随机 User-Agent
@@ -585,6 +1031,46 @@ class FanqieDownloader:
         self._update_client_hints()
         
         self.cookies = cookies
+
+        # 连接池：所有请求共用一个 Session，复用 TCP/TLS 连接 (keep-alive)
+        # pool_size 为每个主机保持的最大连接数，应不小于同时访问该主机的线程数
+        self.pool_size = pool_size
+        self._session_lock = threading.Lock()
+        self.session = requests.Session()
+        self._mount_adapters(self.session)
+
+        # 请求超时与章节重试策略 (指数退避，单位: 秒)
+        self.timeout = 30
+        self.max_retries = 3
+        self.retry_base_delay = 1.0
+        self.retry_max_delay = 30.0
+
+        # 按主机的全局令牌桶：默认与进程内所有下载器共享，限制总请求速率
+        self.host_limiter = limiter or global_limiter
+        # 自适应速率控制：delay < 0 (自适应模式) 时用于章节请求的节奏控制；
+        # 上限跟随站点令牌桶的速率，超过令牌桶的速率不会生效
+        self.rate_controller = AdaptiveRateController()
+        budget = self.host_limiter.get_rate('fanqienovel.com')
+        if budget:
+            self.rate_controller.set_max_rate(budget)
+
+        # 磁盘内容缓存 (可选)，通过 enable_cache 启用
+        self.cache = None
+        # 图片缓存：默认与进程内所有下载器及界面共享
+        self.image_cache = image_cache or global_image_cache
+
+        # 章节解析引擎: 'lxml' 直接遍历 lxml 元素树 (默认，更快)；'bs4' 使用 BeautifulSoup，用于对比验证
+        self.chapter_parser = 'lxml'
+
+        # 解析进程池 (可选)，通过 enable_parse_pool 启用
+        self.parse_pool = None
+
+        # 跨书籍的章节调度器 (可选)，通过 enable_scheduler 启用
+        self.scheduler = None
+
+        # 章节响应分类统计 (正文/风控/锁定/错误)
+        self.page_stats = PageStats()
+
         # 字符集来自研究（番茄小说混淆映射）
         # 注意：此映射可能会随时间变化。
         self.code_start = 58344
@@ -611,6 +1097,8 @@ class FanqieDownloader:
             '2', '音', '字', 'm', '呢', '明', '之', '前', '高', 'P', 'B', '目', '太', 'e', '9', '起', '稜', '她', '也',
             'W', '用', '方', '子', '英', '每', '理', '便', '西', '数', '期', '中', 'C', '外', '样', 'a', '海', '们', '任'
         ]
+        # 预先编译为 str.translate 映射表，decode_text 不再逐字符调用 decode_char
+        self._build_decode_table()
 
     def _generate_random_ua(self):
         """生成随机的高拟真 User-Agent"""
@@ -696,6 +1184,123 @@ class FanqieDownloader:
             self.headers.pop('Sec-CH-UA-Mobile', None)
             self.headers.pop('Sec-CH-UA-Platform', None)
 
+    def _mount_adapters(self, session):
+        """为 Session 挂载带连接池的适配器"""
+        # pool_connections: 缓存的主机连接池个数 (站点、图片 CDN 等)
+        # pool_maxsize: 单个主机的最大空闲连接数
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def set_pool_size(self, pool_size):
+        """调整每个主机的连接池大小（例如并发任务数变化时）"""
+        with self._session_lock:
+            if pool_size == self.pool_size:
+                return
+            self.pool_size = pool_size
+            # 先关闭旧适配器释放其空闲连接，再挂载新的；
+            # 正在进行的请求仍持有自己的连接，完成后归还到已关闭的池时直接断开
+            old_adapters = set(self.session.adapters.values())
+            self._mount_adapters(self.session)
+            for adapter in old_adapters:
+                adapter.close()
+
+    def close(self):
+        """关闭连接池，释放所有连接；同时关闭解析进程池和章节调度器"""
+        with self._session_lock:
+            self.session.close()
+        if self.parse_pool:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+            self.parse_pool = None
+        if self.scheduler:
+            self.scheduler.close()
+            self.scheduler = None
+
+    def enable_scheduler(self, workers):
+        """
+        启用跨书籍的章节调度器：所有同时下载的书籍共用 workers 个获取线程，
+        以章节为单位分配，小书下载完后空出的线程会继续获取其他书籍 (包括大书) 的章节。
+        已启用时只调整线程数。
+        """
+        if self.scheduler:
+            self.scheduler.set_workers(workers)
+        else:
+            self.scheduler = ChapterScheduler(workers)
+
+    def enable_parse_pool(self, workers=None):
+        """
+        启用解析进程池：下载线程只负责网络请求，把原始响应字节交给子进程解析和解码，
+        解析可以利用多个 CPU 核心，也不再与界面线程争抢 GIL。
+        :param workers: 进程数，默认为 CPU 核心数
+        """
+        if self.parse_pool:
+            return
+        self.parse_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_parse_process,
+            initargs=(self.code_start, self.code_end, self.charset, self.chapter_parser)
+        )
+
+    def _parse_response(self, kind, response):
+        """
+        解析响应页面，启用进程池时在子进程中完成。
+        直接解析响应的原始字节，不生成解码后的 str 副本。
+        kind: 'chapter' -> (内容列表或 None, 页面标题)；'book' -> 书籍信息；'rank' -> 书籍列表
+        """
+        pool = self.parse_pool
+        if pool:
+            try:
+                future = pool.submit(_parse_in_process, kind, response.content)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # 进程池已损坏或已关闭，无法提交
+                self._drop_parse_pool(pool, e)
+            else:
+                try:
+                    return future.result()
+                except BrokenProcessPool as e:
+                    self._drop_parse_pool(pool, e)
+        return _parse_page(self, kind, response.content)
+
+    def _drop_parse_pool(self, pool, error):
+        """子进程异常退出时关闭进程池，之后都在本线程解析；多个线程同时遇到时只处理和提示一次"""
+        with self._session_lock:
+            if self.parse_pool is not pool:
+                return
+            self.parse_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        print(f"解析进程池不可用，改为线程内解析: {error}")
+
+    def enable_cache(self, cache_dir, max_bytes=500 * 1024 * 1024, book_ttl=600, image_max_bytes=200 * 1024 * 1024):
+        """
+        启用磁盘内容缓存：章节内容按 URL 缓存 (LRU 淘汰)，书籍信息缓存 book_ttl 秒。
+        图片缓存的磁盘层放在 cache_dir/images 下，上限为 image_max_bytes。
+        """
+        self.cache = ContentCache(cache_dir, max_bytes, book_ttl)
+        self.image_cache.enable_disk(os.path.join(cache_dir, 'images'), image_max_bytes)
+
+    def _is_chapter_cached(self, url):
+        return self.cache is not None and self.cache.has_chapter(url)
+
+    def set_request_budget(self, rate, host='fanqienovel.com'):
+        """设置对站点的总请求速率 (次/秒)，所有共享该限流器的线程一起遵守；自适应速率的上限随之调整"""
+        self.host_limiter.set_rate(host, rate)
+        if host == 'fanqienovel.com':
+            self.rate_controller.set_max_rate(rate)
+
+    def _get(self, url, headers=None, **kwargs):
+        """
+        所有网络请求的统一入口，通过共享 Session 复用连接。
+        每次请求时传入当前 headers/cookies，保证与浏览器同步后的 UA、Cookie 生效。
+        请求前先从全局令牌桶取得配额。
+        """
+        self.host_limiter.acquire(url)
+        return self._send(url, headers, **kwargs)
+
+    def _send(self, url, headers=None, **kwargs):
+        """直接发出请求，不经过令牌桶；调用方需自行先 acquire"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, headers=headers or self.headers, cookies=self.cookies, **kwargs)
+
     def decode_char(self, char_code):
         if self.code_start <= char_code <= self.code_end:
             bias = char_code - self.code_start
@@ -703,178 +1308,366 @@ class FanqieDownloader:
                 return self.charset[bias]
         return chr(char_code)
 
+    def _build_decode_table(self):
+        """根据 code_start/code_end/charset 生成解码映射表，修改字符集后需重新调用"""
+        self.decode_table = {
+            self.code_start + bias: char
+            for bias, char in enumerate(self.charset)
+            if self.code_start + bias <= self.code_end
+        }
+
     def decode_text(self, text):
-        decoded = []
-        for char in text:
-            decoded.append(self.decode_char(ord(char)))
-        return "".join(decoded)
+        return text.translate(self.decode_table)
 
     def get_image_content(self, url):
         """
         下载图片内容
         """
+        image = self.fetch_image(url)
+        if not image:
+            # 静默失败，返回None
+            return None
+        with image[1] as f:
+            return f.read()
+
+    def fetch_image(self, url):
+        """
+        获取图片，经过进程内共享的图片缓存，同一 URL 只下载一次。
+        返回: (内容哈希, 已定位到开头的文件对象)，调用方负责关闭文件；失败返回 None
+        """
+        return self.image_cache.open(url, self._download_image)
+
+    def _download_image(self, url):
+        """
+        以流方式下载图片，分块写入临时文件对象 (不超过 IMAGE_SPOOL_BYTES 时留在内存中)，
+        不再拼接出完整的 bytes 副本，写入 EPUB 时也按块复制。
+        返回: 已定位到开头的文件对象；失败返回 None
+        """
+        headers = self.headers.copy()
+        headers['Referer'] = 'https://fanqienovel.com/'
+        spool = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_BYTES)
         try:
-            # 简单的防盗链处理
-            headers = self.headers.copy()
-            headers['Referer'] = 'https://fanqienovel.com/'
-            
-            response = requests.get(url, headers=headers, cookies=self.cookies, timeout=30)
-            response.raise_for_status()
-            return response.content
-        except Exception as e:
+            with self._get(url, headers=headers, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(IMAGE_CHUNK_BYTES):
+                    spool.write(chunk)
+            if spool.tell() == 0:
+                spool.close()
+                return None
+            spool.seek(0)
+            return spool
+        except Exception:
             # 静默失败，返回None
+            spool.close()
             return None
 
     def get_book_info(self, url):
         """
         获取书籍信息和章节列表。
+        启用缓存时，有效期内的书籍信息直接从缓存返回。
         """
+        if self.cache:
+            cached = self.cache.get_book(url)
+            if cached:
+                cached['chapters'] = ChapterList(cached['chapters'])
+                return cached
         try:
-            response = requests.get(url, headers=self.headers, cookies=self.cookies)
-            response.encoding = 'utf-8'
+            response = self._get(url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            # 尝试获取标题
-            title_tag = soup.select_one('.info-name h1') or soup.select_one('h1')
-            title = title_tag.get_text(strip=True) if title_tag else "Unknown_Book"
-            title = self.decode_text(title)
-            
-            # 尝试获取作者
-            author_tag = soup.select_one('.author-name-text')
-            author = author_tag.get_text(strip=True) if author_tag else "Unknown_Author"
-            author = self.decode_text(author)
-
-            # 尝试获取简介
-            intro_tag = soup.select_one('.page-abstract-content')
-            introduction = intro_tag.get_text(strip=True) if intro_tag else "No introduction available."
-            introduction = self.decode_text(introduction)
-
-            # 获取章节
-            chapters = []
-            # 选择器可能会变化，尝试常见的选择器
-            chapter_items = soup.select('.chapter-item a') or soup.select('.chapter-list a')
-            
-            for item in chapter_items:
-                chapter_title = item.get_text(strip=True)
-                chapter_href = item.get('href')
-                if chapter_href:
-                    if not chapter_href.startswith('http'):
-                        chapter_href = 'https://fanqienovel.com' + chapter_href
-                    chapters.append({
-                        'title': chapter_title,
-                        'url': chapter_href
-                    })
-            
-            return {
-                'title': title,
-                'author': author,
-                'introduction': introduction,
-                'chapters': chapters,
-                'cover_url': self._get_cover_url(soup)
-            }
+            book_info = self._parse_response('book', response)
+            if self.cache and book_info['chapters']:
+                self.cache.put_book(url, dict(book_info, chapters=book_info['chapters'].to_list()))
+            return book_info
         except Exception as e:
             raise Exception(f"获取书籍信息失败: {str(e)}")
 
-    def _get_cover_url(self, soup):
+    def parse_book_info(self, page_text):
+        """
+        解析书籍详情页 HTML (响应原始字节或 str)，返回书籍信息和章节列表。
+        只用预编译的 XPath 定位需要的节点，所有 script 只遍历一次。
+        """
+        root = _html_root(page_text)
+        if root is None:
+            raise ValueError("页面内容为空")
+        text_cache = {}
+
+        def first_text(*xpaths):
+            for xpath in xpaths:
+                nodes = xpath(root)
+                if nodes:
+                    return "".join(self._text_pieces(nodes[0], text_cache))
+            return None
+
+        # 尝试获取标题
+        title = first_text(BOOK_TITLE_XPATH, BOOK_H1_XPATH)
+        title = self.decode_text(title if title is not None else "Unknown_Book")
+        
+        # 尝试获取作者
+        author = first_text(BOOK_AUTHOR_XPATH)
+        author = self.decode_text(author if author is not None else "Unknown_Author")
+
+        # 尝试获取简介
+        introduction = first_text(BOOK_INTRO_XPATH)
+        introduction = self.decode_text(introduction if introduction is not None else "No introduction available.")
+
+        # 获取章节 (紧凑存储，见 ChapterList)
+        chapter_pairs = []
+        # 选择器可能会变化，尝试常见的选择器
+        chapter_items = CHAPTER_ITEM_XPATH(root) or CHAPTER_LIST_XPATH(root)
+        
+        for item in chapter_items:
+            chapter_href = item.get('href')
+            if chapter_href:
+                if not chapter_href.startswith('http'):
+                    chapter_href = 'https://fanqienovel.com' + chapter_href
+                chapter_pairs.append(("".join(self._text_pieces(item, text_cache)), chapter_href))
+        chapters = ChapterList.from_pairs(chapter_pairs)
+        
+        book_info = {
+            'title': title,
+            'author': author,
+            'introduction': introduction,
+            'chapters': chapters,
+            'cover_url': self._get_cover_url(root)
+        }
+        return book_info
+
+    def _get_cover_url(self, root):
         """
         提取封面图片URL
         """
         try:
             # 1. 优先从 JSON-LD 数据中获取（通常包含高清、无水印且正确的封面）
-            scripts = soup.find_all('script', type='application/ld+json')
-            for script in scripts:
-                if not script.string:
+            # 2. 其次从 script 中正则匹配 novel-pic 链接
+            # 两种来源在同一次遍历中收集，JSON-LD 优先
+            json_ld_cover = None
+            script_cover = None
+            for script in root.iter('script'):
+                text = script.text
+                if not text:
                     continue
-                try:
-                    data = json.loads(script.string)
-                    # 统一处理为列表
-                    items = data if isinstance(data, list) else [data]
-                    
-                    for item in items:
-                        # 检查 image 字段
-                        if 'image' in item:
-                            img = item['image']
-                            if isinstance(img, list) and img:
-                                return img[0]
-                            elif isinstance(img, str) and img:
-                                return img
-                        # 检查 images 字段 (部分 schema 使用此字段)
-                        if 'images' in item:
-                            img = item['images']
-                            if isinstance(img, list) and img:
-                                return img[0]
-                            elif isinstance(img, str) and img:
-                                return img
-                except:
-                    continue
-
-            # 2. 尝试从 script 中正则匹配（作为 JSON-LD 的补充）
-            # 匹配类似 "https://...novel-pic..." 的链接
-            scripts = soup.find_all('script')
-            for script in scripts:
-                if script.string and 'novel-pic' in script.string:
-                    urls = re.findall(r'https?://[^"\'\s]+novel-pic[^"\'\s]+', script.string)
-                    if urls:
+                if json_ld_cover is None and script.get('type') == 'application/ld+json':
+                    json_ld_cover = self._cover_from_json_ld(text)
+                    if json_ld_cover:
+                        break
+                if script_cover is None and 'novel-pic' in text:
+                    # 匹配类似 "https://...novel-pic..." 的链接
+                    match = NOVEL_PIC_PATTERN.search(text)
+                    if match:
                         # 过滤掉转义字符
-                        clean_url = urls[0].replace('\\u002F', '/').replace('\\', '')
-                        return clean_url
+                        script_cover = match.group(0).replace('\\u002F', '/').replace('\\', '')
+            if json_ld_cover or script_cover:
+                return json_ld_cover or script_cover
 
             # 3. 尝试 CSS 选择器，但要过滤掉默认占位图
-            img = soup.select_one('.book-cover-img') or \
-                  soup.select_one('.book-img img') or \
-                  soup.select_one('.page-header-left img')
-            
-            if img:
-                src = img.get('src')
-                if src:
-                    # 处理相对路径或无协议的URL
-                    if src.startswith('//'):
-                        full_src = 'https:' + src
-                    elif src.startswith('/'):
-                        full_src = 'https://fanqienovel.com' + src
-                    else:
-                        full_src = src
-                    
-                    # 过滤占位图 (novel-static 通常是静态资源或占位图)
-                    if 'novel-static' not in full_src:
-                        return full_src
+            for xpath in (COVER_IMG_XPATH, COVER_BOOK_IMG_XPATH, COVER_HEADER_IMG_XPATH):
+                nodes = xpath(root)
+                if nodes:
+                    src = nodes[0].get('src')
+                    if src:
+                        # 处理相对路径或无协议的URL
+                        if src.startswith('//'):
+                            full_src = 'https:' + src
+                        elif src.startswith('/'):
+                            full_src = 'https://fanqienovel.com' + src
+                        else:
+                            full_src = src
+                        
+                        # 过滤占位图 (novel-static 通常是静态资源或占位图)
+                        if 'novel-static' not in full_src:
+                            return full_src
+                    break
         except Exception as e:
             print(f"提取封面出错: {e}")
         return None
 
+    def _cover_from_json_ld(self, text):
+        """从 JSON-LD 数据中取 image/images 字段，解析失败返回 None"""
+        try:
+            data = json.loads(text)
+            # 统一处理为列表
+            items = data if isinstance(data, list) else [data]
+            
+            for item in items:
+                # 检查 image 字段，部分 schema 使用 images 字段
+                for key in ('image', 'images'):
+                    if key in item:
+                        img = item[key]
+                        if isinstance(img, list) and img:
+                            return img[0]
+                        elif isinstance(img, str) and img:
+                            return img
+        except:
+            pass
+        return None
+
     def get_chapter_content(self, url):
         """
         获取并解码单个章节的内容。
+        网络错误、超时及 429/5xx 响应按带随机抖动的指数退避重试，
+        仍失败则抛出 ChapterFetchError，由调用方决定是否重新排队。
+        启用缓存时优先读取缓存，不产生网络请求。
         返回: list of dict {'type': 'text'|'image', 'data': str}
         """
+        if self.cache:
+            cached = self.cache.get_chapter(url)
+            if cached is not None:
+                return cached
+
+        attempt = 0
+        while True:
+            try:
+                return self._fetch_chapter_once(url)
+            except VerificationError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_transient_error(e):
+                    raise ChapterFetchError(f"获取章节出错: {str(e)}") from e
+                attempt += 1
+                time.sleep(self._backoff_delay(attempt))
+
+    def _is_transient_error(self, error):
+        """判断错误是否值得重试：网络错误、超时、429 及 5xx"""
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            code = error.response.status_code
+            return code == 429 or code >= 500
+        return False
+
+    def _backoff_delay(self, attempt):
+        """第 attempt 次重试前的等待时间：指数增长并加入完全随机抖动"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    def _fetch_chapter_once(self, url):
+        """单次请求并解析章节页面"""
+        # 令牌桶的等待不计入耗时，否则限流本身会被速率控制器误判为服务器变慢
+        self.host_limiter.acquire(url)
+        start = time.monotonic()
         try:
-            response = requests.get(url, headers=self.headers, cookies=self.cookies)
-            response.encoding = 'utf-8'
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'lxml')
-            
+            response = self._send(url)
+        except requests.RequestException as e:
+            self.rate_controller.on_failure(f"网络错误 {type(e).__name__}")
+            raise
+        latency = time.monotonic() - start
+        # 先根据状态码和原始字节分类，风控页、锁定页和错误响应不再构建 DOM
+        page_kind = classify_page(response.status_code, response.content, response.url if response.history else '')
+        if page_kind == PAGE_CONTENT:
+            content, _ = self._parse_response('chapter', response)
+            if content is None:
+                # 标记出现在正文节点以外 (如脚本中)，按没有正文的页面处理
+                page_kind = classify_missing_content(response.content)
+        self.page_stats.record(page_kind)
+
+        if page_kind == PAGE_ERROR:
+            if response.status_code >= 400:
+                self.rate_controller.on_failure(f"HTTP {response.status_code}")
+                response.raise_for_status()
+            # 连接本身正常，不计入速率控制的失败，也不在这里退避重试，由调用方重新排队
+            raise EmptyResponseError("响应内容为空")
+        if page_kind == PAGE_WAF:
+            self.rate_controller.on_failure("验证码", verification=True)
+            raise VerificationError("检测到验证码或风控页面")
+        if page_kind == PAGE_VIP:
+            # 如果只是 VIP 锁定，通常会有特定的提示，这里简单处理
+            return [{"type": "text", "data": "未找到内容或内容被锁定（VIP章节）。"}]
+
+        self.rate_controller.on_success(latency)
+
+        # 只缓存正常章节，验证码页和 VIP 锁定提示不缓存
+        if self.cache:
+            self.cache.put_chapter(url, content)
+        return content
+
+    def parse_chapter_html(self, page_text, parser=None):
+        """
+        从章节页面 HTML (响应原始字节或 str) 提取正文 (文本和图片)，不发起网络请求。
+        :param parser: 'lxml' 或 'bs4'，默认使用 self.chapter_parser
+        返回: 内容列表；页面中没有正文节点 (验证码页、VIP 锁定等) 时返回 None
+        """
+        return self._parse_chapter_page(page_text, parser)[0]
+
+    def _parse_chapter_page(self, page_text, parser=None):
+        """返回 (内容列表或 None, 页面标题)"""
+        if (parser or self.chapter_parser) == 'bs4':
+            soup = _soup(page_text)
             # 内容选择器
             content_div = soup.select_one('.muye-reader-content') or soup.select_one('.muye-reader-content-16')
-            
             if not content_div:
-                # 检查是否是验证码页面
-                # 1. 检查 title
-                page_title = soup.title.string if soup.title else ""
-                # 2. 检查常见验证码关键字或脚本
-                page_text = response.text
-                if "WAF" in page_title or "验证" in page_title or "captcha" in page_text or "verify" in page_text:
-                    raise VerificationError("检测到验证码或风控页面")
-                
-                # 如果只是 VIP 锁定，通常会有特定的提示，这里简单处理
-                return [{"type": "text", "data": "未找到内容或内容被锁定（VIP章节）。"}]
+                return None, soup.title.string if soup.title else None
+            return self._extract_content_recursively(content_div), None
+
+        root = _html_root(page_text)
+        if root is None:
+            return None, None
+        nodes = CONTENT_XPATH(root) or CONTENT_XPATH_16(root)
+        if not nodes:
+            return None, root.findtext('.//title')
+        content_div = nodes[0]
+        # 先标记所有包含图片的元素，避免对每个子节点重复查找图片
+        has_img = set()
+        for img in content_div.iter('img'):
+            for ancestor in img.iterancestors():
+                if ancestor in has_img or ancestor is content_div:
+                    break
+                has_img.add(ancestor)
+        items = []
+        self._extract_content_lxml(content_div, has_img, items)
+        return items, None
 
-            # 提取内容（文本和图片）
-            return self._extract_content_recursively(content_div)
-        except VerificationError:
-            raise
-        except Exception as e:
-            return [{"type": "text", "data": f"获取章节出错: {str(e)}"}]
+    def _extract_content_lxml(self, element, has_img, items):
+        """
+        按文档顺序遍历 lxml 元素，规则与 _extract_content_recursively 相同
+        """
+        if element.tag == 'img':
+            src = element.get('src')
+            if src:
+                items.append({'type': 'image', 'data': src})
+            return
+
+        self._append_text(items, element.text)
+        for child in element:
+            tag = child.tag
+            if not isinstance(tag, str):
+                # 注释节点，与 BeautifulSoup 一样按文本处理
+                self._append_text(items, child.text)
+            elif tag == 'img':
+                src = child.get('src')
+                if src:
+                    items.append({'type': 'image', 'data': src})
+            elif tag == 'div' or child in has_img:
+                # 递归处理 div 以及混杂了图片的段落/标签
+                self._extract_content_lxml(child, has_img, items)
+            else:
+                # 普通文本段落及其他标签（如 span, strong 等）
+                self._append_text(items, self._element_text(child))
+            self._append_text(items, child.tail)
+
+    def _append_text(self, items, raw_text):
+        if raw_text:
+            decoded_text = self.decode_text(raw_text)
+            if decoded_text.strip():
+                items.append({'type': 'text', 'data': decoded_text})
+
+    def _element_text(self, element, preserve=False):
+        """拼接元素内的全部文字，等价于 BeautifulSoup 的 get_text()"""
+        preserve = preserve or element.tag in PRESERVE_WS_TAGS
+        if len(element) == 0:
+            return self._collapse_blank(element.text, preserve)
+        parts = [self._collapse_blank(element.text, preserve)]
+        for child in element:
+            if isinstance(child.tag, str) and child.tag not in SKIP_TEXT_TAGS:
+                parts.append(self._element_text(child, preserve))
+            parts.append(self._collapse_blank(child.tail, preserve))
+        return ''.join(parts)
+
+    def _collapse_blank(self, text, preserve):
+        # BeautifulSoup 会把只含空白的文本节点压缩为一个换行或空格
+        if not text:
+            return ''
+        if preserve or text.strip(' \n\t\x0c\r'):
+            return text
+        return '\n' if '\n' in text else ' '
 
     def _extract_content_recursively(self, element):
         """
@@ -940,9 +1733,9 @@ class FanqieDownloader:
         """
         try:
             url = "https://fanqienovel.com/rank"
-            response = requests.get(url, headers=self.headers, cookies=self.cookies)
+            response = self._get(url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'lxml')
+            soup = _soup(response.content)
             
             categories = []
             seen = set()
@@ -965,14 +1758,18 @@ class FanqieDownloader:
 
     def parse_rank_books(self, html_content, base_url="https://fanqienovel.com"):
         """
-        解析排行榜 HTML 内容获取书籍列表。
+        解析排行榜 HTML 内容 (响应原始字节或 str) 获取书籍列表。
+        一次遍历所有链接，容器文本按元素缓存，同一容器只提取一次文本。
         """
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
+            root = _html_root(html_content)
+            if root is None:
+                return []
             books = []
             seen_books = {} # url -> {'index': int, 'from_img': bool}
+            text_cache = {} # 元素 -> 去除空白后的文本片段列表
 
-            for link in soup.find_all('a'):
+            for link in root.iter('a'):
                 href = link.get('href')
                 if href and '/page/' in href:
                     full_url = base_url + href if not href.startswith('http') else href
@@ -981,35 +1778,37 @@ class FanqieDownloader:
                     from_img = False
 
                     # 1. 优先尝试从图片 alt 获取标题 (通常最准确且无干扰)
-                    img = link.find('img')
-                    if img and img.get('alt'):
+                    img = next(link.iter('img'), None)
+                    if img is not None and img.get('alt'):
                         title = img.get('alt')
                         from_img = True
                     
                     # 尝试查找其他可能的标题来源
                     if not title:
-                        # 尝试找内部的 h4 或其他标题标签
-                        for tag in ['h1', 'h2', 'h3', 'h4', 'div', 'span']:
-                            found_tag = link.find(tag, class_=lambda x: x and ('name' in x or 'title' in x))
-                            if found_tag:
-                                title = found_tag.get_text(strip=True)
+                        # 尝试找内部的 h4 或其他标题标签，按标签优先级取第一个 class 含 name/title 的元素
+                        found = {}
+                        for el in link.iterdescendants(*RANK_TITLE_TAGS):
+                            if el.tag not in found and RANK_TITLE_CLASS.search(el.get('class') or ''):
+                                found[el.tag] = el
+                        for tag in RANK_TITLE_TAGS:
+                            if tag in found:
+                                title = "".join(self._text_pieces(found[tag], text_cache))
                                 break
 
                     # 2. 其次尝试直接获取文本
                     if not title:
-                        title = link.get_text(strip=True)
+                        title = "".join(self._text_pieces(link, text_cache))
                     
                     if not title:
                         title = "Unknown Title"
 
                     # 3. 尝试解码标题（处理混淆字符）
-                    # 只有当 title 看起来被混淆（包含特定范围的字符）或者我们确定它是从文本中提取的才尝试解码
-                    # 但 decode_text 是安全的，如果字符不在范围内会返回原字符
+                    # decode_text 是安全的，如果字符不在范围内会返回原字符
                     title = self.decode_text(title)
 
                     # 4. 简单的标题清理
                     # 如果标题包含中文且有空格，可能是格式问题，尝试去除空格
-                    if title and any('\u4e00' <= char <= '\u9fff' for char in title):
+                    if title and CJK_PATTERN.search(title):
                          title = "".join(title.split())
 
                     if full_url in seen_books:
@@ -1018,81 +1817,89 @@ class FanqieDownloader:
                         if not entry['from_img'] and from_img:
                              books[entry['index']]['title'] = title
                              entry['from_img'] = True
-                    else:
-                        books.append({'title': title, 'url': full_url})
-                        seen_books[full_url] = {'index': len(books)-1, 'from_img': from_img}
-
-                    # --- 提取额外元数据 (状态, 在读, 更新) ---
-                    # 获取当前书籍对象的引用
-                    if full_url in seen_books:
-                        current_book = books[seen_books[full_url]['index']]
-                    else:
-                        # 理论上不应该走到这里，因为上面已经添加了
+                        # 元数据已在首次出现时提取
                         continue
 
-                    # 如果元数据尚未提取 (避免重复提取)
-                    if 'status' not in current_book:
-                        status = "未知"
-                        reading_count = "未知"
-                        last_update = "未知"
-                        update_time = "未知"
-
-                        # 尝试查找包含元数据的父容器
-                        # 通常这些信息在链接的父级或祖父级的文本中
-                        # 我们向上查找直到找到包含 "连载中" 或 "已完结" 的容器，或者达到一定的深度
-                        container = link.parent
-                        found_meta = False
-                        for _ in range(3): # 向上查找最多3层
-                            if container and container.name != 'body':
-                                text = container.get_text(" ", strip=True)
-                                if '连载中' in text or '已完结' in text:
-                                    found_meta = True
-                                    break
-                                container = container.parent
-                            else:
-                                break
-                        
-                        if found_meta and container:
-                            text = container.get_text(" ", strip=True)
-                            
-                            # 状态
-                            m_status = re.search(r'(连载中|已完结)', text)
-                            if m_status:
-                                status = m_status.group(1)
-                            
-                            # 在读
-                            m_read = re.search(r'在读[:：]?\s*([\d\.万]+)', text)
-                            if m_read:
-                                reading_count = m_read.group(1)
-                                
-                            # 最近更新
-                            if '最近更新' in text:
-                                # 简单的分割提取
-                                parts = text.split('最近更新')
-                                if len(parts) > 1:
-                                    update_part = parts[1].strip()
-                                    # 尝试提取时间 (yyyy-mm-dd HH:MM or yyyy-mm-dd)
-                                    m_date = re.search(r'(\d{4}-\d{2}-\d{2}(?:\s+\d{2}:\d{2})?)', update_part)
-                                    if m_date:
-                                        update_time = m_date.group(1)
-                                        # 截取到时间之前的部分作为章节名
-                                        last_update = update_part[:m_date.start()].strip(" :：|")
-                                    else:
-                                        # 如果没找到时间，就取前一段
-                                        last_update = update_part.strip(" :：|")
-
-                        current_book.update({
-                            'status': status,
-                            'reading_count': reading_count,
-                            'last_update': last_update,
-                            'update_time': update_time
-                        })
+                    current_book = {'title': title, 'url': full_url}
+                    books.append(current_book)
+                    seen_books[full_url] = {'index': len(books)-1, 'from_img': from_img}
 
+                    # --- 提取额外元数据 (状态, 在读, 更新) ---
+                    current_book.update(self._parse_rank_meta(link, text_cache))
             
             return books
         except Exception as e:
             raise Exception(f"解析书籍列表失败: {str(e)}")
 
+    def _text_pieces(self, element, text_cache):
+        """
+        元素内去除首尾空白后的非空文本片段 (跳过注释和脚本)，结果按元素缓存。
+        "".join(...) 等价于 BeautifulSoup 的 get_text(strip=True)。
+        """
+        pieces = text_cache.get(element)
+        if pieces is None:
+            pieces = []
+            text = element.text.strip() if element.text else ''
+            if text:
+                pieces.append(text)
+            for child in element:
+                if isinstance(child.tag, str) and child.tag not in SKIP_TEXT_TAGS:
+                    pieces.extend(self._text_pieces(child, text_cache))
+                tail = child.tail.strip() if child.tail else ''
+                if tail:
+                    pieces.append(tail)
+            text_cache[element] = pieces
+        return pieces
+
+    def _parse_rank_meta(self, link, text_cache):
+        """从链接所在的容器文本中提取连载状态、在读人数和最近更新"""
+        meta = {
+            'status': "未知",
+            'reading_count': "未知",
+            'last_update': "未知",
+            'update_time': "未知"
+        }
+
+        # 尝试查找包含元数据的父容器
+        # 通常这些信息在链接的父级或祖父级的文本中
+        # 我们向上查找直到找到包含 "连载中" 或 "已完结" 的容器，或者达到一定的深度
+        container = link.getparent()
+        text = None
+        for _ in range(3): # 向上查找最多3层
+            if container is None or container.tag == 'body':
+                return meta
+            text = " ".join(self._text_pieces(container, text_cache))
+            if '连载中' in text or '已完结' in text:
+                break
+            container = container.getparent()
+        else:
+            return meta
+
+        # 状态
+        m_status = RANK_STATUS_PATTERN.search(text)
+        if m_status:
+            meta['status'] = m_status.group(1)
+        
+        # 在读
+        m_read = RANK_READING_PATTERN.search(text)
+        if m_read:
+            meta['reading_count'] = m_read.group(1)
+            
+        # 最近更新
+        if '最近更新' in text:
+            # 简单的分割提取
+            update_part = text.split('最近更新')[1].strip()
+            # 尝试提取时间 (yyyy-mm-dd HH:MM or yyyy-mm-dd)
+            m_date = RANK_DATE_PATTERN.search(update_part)
+            if m_date:
+                meta['update_time'] = m_date.group(1)
+                # 截取到时间之前的部分作为章节名
+                meta['last_update'] = update_part[:m_date.start()].strip(" :：|")
+            else:
+                # 如果没找到时间，就取前一段
+                meta['last_update'] = update_part.strip(" :：|")
+        return meta
+
     def get_rank_books(self, category_url):
         """
         从分类排行榜页面获取书籍。
@@ -1100,49 +1907,209 @@ class FanqieDownloader:
         注意：这里的标题可能会被混淆，所以使用 get_book_info 获取干净的标题。
         """
         try:
-            response = requests.get(category_url, headers=self.headers, cookies=self.cookies)
-            response.encoding = 'utf-8' # 强制使用 UTF-8，防止中文乱码
+            response = self._get(category_url)
             response.raise_for_status()
-            return self.parse_rank_books(response.text)
+            # 解析时强制使用 UTF-8，防止中文乱码
+            return self._parse_response('rank', response)
         except Exception as e:
             raise Exception(f"获取排行榜书籍失败: {str(e)}")
 
     def _sleep(self, delay):
-        """通用休眠逻辑"""
+        """
+        通用休眠逻辑。
+        delay < 0 为自适应模式，由 rate_controller 根据服务器响应动态决定间隔；
+        否则按用户指定的固定间隔休眠。
+        """
         if delay < 0:
-            time.sleep(random.triangular(0.5, 1.0, 0.5))
+            self.rate_controller.acquire()
         else:
             time.sleep(delay)
 
-    def save_book(self, book_data, save_dir, formatter, chapter_indices=None, split_files=False, control_callback=None, delay=-1, progress_callback=None, max_chapters=0, verification_callback=None):
+    def _progress_title(self, title, delay):
+        """进度文本，自适应模式下附带当前速率/退避状态，出现过异常响应时附带分类统计"""
+        status = []
+        if delay < 0:
+            status.append(self.rate_controller.describe())
+        page_stats = self.page_stats.describe()
+        if page_stats:
+            status.append(page_stats)
+        if status:
+            return f"{title} [{', '.join(status)}]"
+        return title
+
+    def _fetch_with_verification(self, url, verification_callback):
+        """获取章节内容，遇到验证码时交给回调处理后重试"""
+        while True:
+            try:
+                return self.get_chapter_content(url)
+            except VerificationError:
+                if verification_callback:
+                    # 调用验证回调，通常这会暂停程序直到用户解决验证码
+                    verification_callback(url)
+                    # 回调返回后（用户点击继续），继续循环重试
+                    continue
+                else:
+                    raise
+
+    def _fetch_chapters_sequentially(self, book_data, indices, control_callback, progress_callback, delay, verification_callback):
+        """
+        逐章获取：获取 -> 交给调用方写入 -> 休眠。
+        生成 (序号, 真实索引, 章节, 内容)，重试后仍失败的章节内容为 None
+        """
+        total = len(indices)
+        for i, real_idx in enumerate(indices):
+            chapter = book_data['chapters'][real_idx]
+
+            if control_callback:
+                control_callback()
+
+            if progress_callback:
+                progress_callback(i + 1, total, self._progress_title(chapter['title'], delay))
+
+            # 缓存命中不产生请求，无需休眠
+            cached = self._is_chapter_cached(chapter['url'])
+            try:
+                content = self._fetch_with_verification(chapter['url'], verification_callback)
+            except ChapterFetchError:
+                content = None
+            yield i, real_idx, chapter, content
+
+            if not cached:
+                self._sleep(delay)
+
+    def _fetch_chapters_scheduled(self, book_data, indices, concurrency, control_callback, progress_callback, delay, verification_callback, on_fetched=None):
+        """
+        通过章节调度器并发获取：章节由获取线程领取，本书的公平份额为 concurrency，
+        结果按章节顺序交付 (重排序缓冲区)，保证写入顺序与目录一致。
+        启用了共享调度器 (enable_scheduler) 时与其他书籍共用获取线程，否则为本书单独创建一个，获取结束后关闭。
+        on_fetched(内容, 真实索引): 章节获取完成时在获取线程中调用，用于提前下载图片等资源
+        生成 (序号, 真实索引, 章节, 内容)，重试后仍失败的章节内容为 None
+        """
+        total = len(indices)
+        scheduler = self.scheduler
+        owned = scheduler is None
+        if owned:
+            scheduler = ChapterScheduler(concurrency)
+
+        def fetch(real_idx):
+            url = book_data['chapters'][real_idx]['url']
+            if not self._is_chapter_cached(url):
+                self._sleep(delay)
+            content = self.get_chapter_content(url)
+            if on_fetched:
+                on_fetched(content, real_idx)
+            return content
+
+        job = scheduler.submit(fetch, indices, limit=max(1, concurrency))
+        try:
+            for i, content, error in job.results_in_order(control_callback):
+                real_idx = indices[i]
+                chapter = book_data['chapters'][real_idx]
+                if control_callback:
+                    control_callback()
+
+                if isinstance(error, VerificationError):
+                    if not verification_callback:
+                        raise error
+                    scheduler.gate.clear()
+                    try:
+                        content = self._fetch_with_verification(chapter['url'], verification_callback)
+                    except ChapterFetchError:
+                        content = None
+                    finally:
+                        scheduler.gate.set()
+                elif error is not None and not isinstance(error, ChapterFetchError):
+                    raise error
+
+                if progress_callback:
+                    progress_callback(i + 1, total, self._progress_title(chapter['title'], delay))
+                yield i, real_idx, chapter, content
+        finally:
+            job.cancel()
+            if owned:
+                scheduler.close()
+
+    def _retry_failed_chapters(self, book_data, failed, control_callback, progress_callback, delay, verification_callback):
+        """
+        重新获取首轮失败的章节。
+        返回: (recovered, still_failed) - {真实索引: 内容} 与仍失败的真实索引列表
+        """
+        recovered = {}
+        still_failed = []
+        total = len(failed)
+        for i, real_idx in enumerate(failed):
+            chapter = book_data['chapters'][real_idx]
+            if control_callback:
+                control_callback()
+            if progress_callback:
+                progress_callback(i + 1, total, f"重试失败章节: {chapter['title']}")
+            if not self._is_chapter_cached(chapter['url']):
+                self._sleep(delay)
+            try:
+                recovered[real_idx] = self._fetch_with_verification(chapter['url'], verification_callback)
+            except ChapterFetchError:
+                still_failed.append(real_idx)
+        return recovered, still_failed
+
+    def _detect_existing(self, formatters, splits, book_data, save_dir, wanted):
+        """
+        检测每种格式本地已有的章节。
+        只能顺序追加的格式，如果需要写入的章节排在已有章节之前 (例如先下载了后半部分)，
+        续写会打乱顺序，此时视为没有已有章节，整个文件重新生成。
+        """
+        existing = []
+        for f, split in zip(formatters, splits):
+            chapters = f.detect_existing_chapters(book_data, save_dir, split)
+            if chapters and f.appends_in_order(split):
+                last = max(chapters)
+                if any(idx < last and idx not in chapters for idx in wanted):
+                    chapters = set()
+            existing.append(chapters)
+        return existing
+
+    def save_book(self, book_data, save_dir, formatter, chapter_indices=None, split_files=False, control_callback=None, delay=-1, progress_callback=None, max_chapters=0, verification_callback=None, concurrency=1, resume=False):
         """
         通用的书籍保存方法，使用策略模式。
+        formatter: 单个 BookFormatter，或多个 BookFormatter 组成的列表。
+                   传入列表时每章只获取一次，同时写入所有格式。
         max_chapters: 限制下载的章节数量（0表示不限制）。
                       如果是新下载，则下载前N章。
                       如果是增量更新，则下载接下来的N章。
+        concurrency: 同一本书同时获取的章节数（1 表示逐章下载）。
+                     并发获取的章节仍按目录顺序写入。
+                     启用章节调度器 (enable_scheduler) 时由调度器统一分配，本书占用的获取线程数同样不超过此值。
+        resume: 指定了 chapter_indices 时也检测本地进度，跳过其中已写入的章节并在原文件后追加
+                (用于恢复中断的任务)；未指定 chapter_indices 时总会检测。
+        返回: 最终文件路径；传入列表时返回与之对应的路径列表
         """
+        formatters = list(formatter) if isinstance(formatter, (list, tuple)) else [formatter]
+        for f in formatters:
+            f.clear_manifest_cache()
+        total_count = len(book_data['chapters'])
+        # 每种格式各自的分章设置 (EPUB 不支持分章)
+        splits = [split_files and f.supports_split for f in formatters]
+        # 每种格式本地已有的章节索引，写入时跳过该格式已有的章节
+        existing = [set() for _ in formatters]
+
         # 0. 自动增量检测
         # 仅当 chapter_indices 为 None (全本下载) 时才启用增量检测
         # 如果用户手动选择了章节范围，则完全遵从用户选择
-        append_mode = False
         if chapter_indices is None:
-            last_index = formatter.detect_existing_progress(book_data, save_dir, split_files)
-            if last_index >= 0:
-                start_idx = last_index + 1
-                if start_idx < len(book_data['chapters']):
-                     # 有新章节，自动生成新的 indices
-                     end_idx = len(book_data['chapters'])
-                     
+            existing = self._detect_existing(formatters, splits, book_data, save_dir, range(total_count))
+            if any(existing):
+                # 只要有一种格式缺少某章，就需要获取该章
+                missing = [idx for idx in range(total_count) if not all(idx in chapters for chapters in existing)]
+                if missing:
                      # 应用 max_chapters 限制
                      if max_chapters > 0:
-                         limit_end = start_idx + max_chapters
-                         if limit_end < end_idx:
-                             end_idx = limit_end
-                             
-                     chapter_indices = list(range(start_idx, end_idx))
-                     append_mode = True
+                         missing = missing[:max_chapters]
+                     chapter_indices = missing
                      
-                     msg = f"检测到本地进度 (已下载至第 {last_index+1} 章)，将从第 {start_idx+1} 章开始续传"
+                     start_idx = missing[0]
+                     if missing == list(range(start_idx, start_idx + len(missing))):
+                         msg = f"检测到本地进度 (已下载至第 {start_idx} 章)，将从第 {start_idx+1} 章开始续传"
+                     else:
+                         msg = f"检测到本地已有部分章节，将补全缺失的 {len(missing)} 章"
                      if max_chapters > 0:
                          msg += f" (限制更新 {max_chapters} 章)"
                      msg += "..."
@@ -1152,76 +2119,160 @@ class FanqieDownloader:
                 else:
                     # 已经全部下载
                     if progress_callback:
-                        progress_callback(0, 0, f"书籍已是最新 (共 {len(book_data['chapters'])} 章)，跳过下载。")
-                    return formatter.get_final_path(save_dir, book_data, split_files)
+                        progress_callback(0, 0, f"书籍已是最新 (共 {total_count} 章)，跳过下载。")
+                    paths = [f.finish_existing(save_dir, book_data, split) for f, split in zip(formatters, splits)]
+                    return paths if isinstance(formatter, (list, tuple)) else paths[0]
+        elif resume:
+            existing = self._detect_existing(formatters, splits, book_data, save_dir, chapter_indices)
+            remaining = [idx for idx in chapter_indices if not all(idx in chapters for chapters in existing)]
+            if not remaining:
+                if progress_callback:
+                    progress_callback(0, 0, f"所选的 {len(chapter_indices)} 章已全部下载，跳过下载。")
+                paths = [f.finish_existing(save_dir, book_data, split) for f, split in zip(formatters, splits)]
+                return paths if isinstance(formatter, (list, tuple)) else paths[0]
+            if len(remaining) < len(chapter_indices):
+                if progress_callback:
+                    progress_callback(0, 0, f"检测到本地进度，跳过已下载的 {len(chapter_indices) - len(remaining)} 章，继续下载剩余 {len(remaining)} 章...")
+                chapter_indices = remaining
+            else:
+                # 所选章节一章都没有写入，按新下载处理
+                existing = [set() for _ in formatters]
 
-        chapters_to_download = []
-        
         # 确保 chapter_indices 有值
         if chapter_indices is None:
-            end_idx = len(book_data['chapters'])
+            end_idx = total_count
             # 如果是全新下载且有限制
             if max_chapters > 0:
                 end_idx = min(max_chapters, end_idx)
             chapter_indices = list(range(end_idx))
 
         # 过滤有效索引
-        valid_indices = [idx for idx in chapter_indices if 0 <= idx < len(book_data['chapters'])]
-        
-        total_chapters = len(valid_indices)
-        
-        # 1. 初始化
-        context = formatter.initialize(book_data, save_dir, split_files, append_mode, downloader=self)
+        valid_indices = [idx for idx in chapter_indices if 0 <= idx < total_count]
         
+        # 1. 初始化 (已是最新的格式不再重新生成)
+        targets = [] # (格式化器, 上下文, 该格式已有的章节)
+        paths = []
+        fetched = None
         try:
-            # 2. 循环下载
-            for i, real_idx in enumerate(valid_indices):
-                chapter = book_data['chapters'][real_idx]
-                
-                if control_callback:
-                    control_callback()
+            for f, split, chapters in zip(formatters, splits, existing):
+                if total_count > 0 and len(chapters) >= total_count:
+                    paths.append(f.finish_existing(save_dir, book_data, split))
+                    continue
+                context = f.initialize(book_data, save_dir, split, bool(chapters), downloader=self)
+                targets.append((f, context, chapters))
+                paths.append(None)
 
-                if progress_callback:
-                    progress_callback(i + 1, total_chapters, chapter['title'])
-                
-                content = None
-                while True:
-                    try:
-                        content = self.get_chapter_content(chapter['url'])
-                        break
-                    except VerificationError:
-                        if verification_callback:
-                            # 调用验证回调，通常这会暂停程序直到用户解决验证码
-                            verification_callback(chapter['url'])
-                            # 回调返回后（用户点击继续），继续循环重试
-                            continue
-                        else:
-                            raise
+            def prefetch(content, real_idx):
+                # 提前开始下载即将写入章节的资源 (如 EPUB 图片)
+                for f, context, chapters in targets:
+                    if real_idx not in chapters:
+                        f.prefetch(context, content, real_idx)
 
-                # 3. 写入章节
+            def write(chapter, content, real_idx):
                 # 注意：传递真实的章节索引 real_idx，确保文件名序号正确 (e.g. 051_xxx.txt)
-                formatter.write_chapter(context, chapter, content, real_idx)
-                
-                # 4. 休眠
-                self._sleep(delay)
+                for f, context, chapters in targets:
+                    if real_idx not in chapters:
+                        f.write_chapter(context, chapter, content, real_idx)
+
+            # 2. 循环下载
+            if self.scheduler or concurrency > 1:
+                if not self.scheduler:
+                    # 单独为本书创建获取线程，保证连接池足够容纳本书的并发请求
+                    self.set_pool_size(max(self.pool_size, concurrency * 2))
+                fetched = self._fetch_chapters_scheduled(book_data, valid_indices, concurrency, control_callback, progress_callback, delay, verification_callback, prefetch)
+            else:
+                fetched = self._fetch_chapters_sequentially(book_data, valid_indices, control_callback, progress_callback, delay, verification_callback)
+
+            failed = [] # 首轮获取失败的章节
+            still_failed = [] # 重试后仍失败、未写入的章节
+            out_of_order = all(f.supports_out_of_order(context) for f, context, _ in targets)
+            for i, real_idx, chapter, content in fetched:
+                if content is None and not out_of_order:
+                    # 顺序写入的格式不缓存后续章节，立即重试失败的章节；
+                    # 仍失败则跳过，后续章节照常写入，下次下载时从缺章处续写 (见 _detect_from_manifest)
+                    failed.append(real_idx)
+                    retry_progress = progress_callback and (lambda c, t, msg, i=i: progress_callback(i, len(valid_indices), msg))
+                    recovered, _ = self._retry_failed_chapters(book_data, [real_idx], control_callback, retry_progress, delay, verification_callback)
+                    content = recovered.get(real_idx)
+                    if content is None:
+                        still_failed.append(real_idx)
+                        continue
+                elif content is None:
+                    failed.append(real_idx)
+                    continue
+                # 3. 写入章节 (所有格式)
+                write(chapter, content, real_idx)
+
+            # 4. 可乱序写入时，本轮结束后统一重新获取失败的章节
+            if failed and out_of_order:
+                recovered, still_failed = self._retry_failed_chapters(book_data, failed, control_callback, progress_callback, delay, verification_callback)
+                for real_idx in sorted(recovered):
+                    write(book_data['chapters'][real_idx], recovered[real_idx], real_idx)
+
+            if failed and progress_callback:
+                if still_failed:
+                    missing = "、".join(str(idx + 1) for idx in still_failed)
+                    progress_callback(len(valid_indices), len(valid_indices), f"完成，但有 {len(still_failed)} 章获取失败未写入 (第 {missing} 章)，可稍后重新下载补全")
+                else:
+                    progress_callback(len(valid_indices), len(valid_indices), f"失败的 {len(failed)} 章已重新获取成功")
             
             # 5. 完成
-            return formatter.finalize(context)
+            finalized = iter([f.finalize(context) for f, context, _ in targets])
+            paths = [path if path is not None else next(finalized) for path in paths]
+            return paths if isinstance(formatter, (list, tuple)) else paths[0]
             
         except Exception as e:
             # 这里可以添加清理逻辑，例如关闭文件句柄
-            if isinstance(context, dict) and 'file_handle' in context:
+            if fetched is not None:
+                fetched.close() # 停止并发获取的工作线程
+            for f, context, _ in targets:
                 try:
-                    context['file_handle'].close()
+                    f.abort(context)
                 except:
                     pass
             raise e
 
-    def save_to_txt(self, book_data, save_dir, progress_callback=None, chapter_indices=None, split_files=False, control_callback=None, delay=-1, max_chapters=0, verification_callback=None):
-        return self.save_book(book_data, save_dir, TxtFormatter(), chapter_indices, split_files, control_callback, delay, progress_callback, max_chapters, verification_callback)
+    def save_to_txt(self, book_data, save_dir, progress_callback=None, chapter_indices=None, split_files=False, control_callback=None, delay=-1, max_chapters=0, verification_callback=None, concurrency=1):
+        return self.save_book(book_data, save_dir, TxtFormatter(), chapter_indices, split_files, control_callback, delay, progress_callback, max_chapters, verification_callback, concurrency)
+
+    def save_to_md(self, book_data, save_dir, progress_callback=None, chapter_indices=None, split_files=False, control_callback=None, delay=-1, max_chapters=0, verification_callback=None, concurrency=1):
+        return self.save_book(book_data, save_dir, MdFormatter(), chapter_indices, split_files, control_callback, delay, progress_callback, max_chapters, verification_callback, concurrency)
 
-    def save_to_md(self, book_data, save_dir, progress_callback=None, chapter_indices=None, split_files=False, control_callback=None, delay=-1, max_chapters=0, verification_callback=None):
-        return self.save_book(book_data, save_dir, MdFormatter(), chapter_indices, split_files, control_callback, delay, progress_callback, max_chapters, verification_callback)
+    def save_to_epub(self, book_data, save_dir, progress_callback=None, chapter_indices=None, control_callback=None, delay=-1, max_chapters=0, verification_callback=None, concurrency=1):
+        return self.save_book(book_data, save_dir, EpubFormatter(), chapter_indices, False, control_callback, delay, progress_callback, max_chapters, verification_callback, concurrency)
 
-    def save_to_epub(self, book_data, save_dir, progress_callback=None, chapter_indices=None, control_callback=None, delay=-1, max_chapters=0, verification_callback=None):
-        return self.save_book(book_data, save_dir, EpubFormatter(), chapter_indices, False, control_callback, delay, progress_callback, max_chapters, verification_callback)
+    def save_to_formats(self, book_data, save_dir, fmts, progress_callback=None, chapter_indices=None, split_files=False, control_callback=None, delay=-1, max_chapters=0, verification_callback=None, concurrency=1, resume=False):
+        """
+        一次下载同时保存为多种格式，fmts 为格式名列表，如 ['txt', 'epub']。
+        返回: 与 fmts 对应的文件路径列表
+        """
+        formatters = [FORMATTERS[fmt]() for fmt in fmts]
+        return self.save_book(book_data, save_dir, formatters, chapter_indices, split_files, control_callback, delay, progress_callback, max_chapters, verification_callback, concurrency, resume)
+
+
+# --- 解析进程池 ---
+
+# 子进程中用于解析的下载器实例，由 _init_parse_process 创建
+_process_parser = None
+
+def _init_parse_process(code_start, code_end, charset, chapter_parser):
+    """进程池初始化：每个子进程创建一次解析用实例，使用与主进程相同的字符集"""
+    global _process_parser
+    _process_parser = FanqieDownloader()
+    _process_parser.code_start = code_start
+    _process_parser.code_end = code_end
+    _process_parser.charset = charset
+    _process_parser.chapter_parser = chapter_parser
+    _process_parser._build_decode_table()
+
+def _parse_in_process(kind, page_bytes):
+    return _parse_page(_process_parser, kind, page_bytes)
+
+def _parse_page(parser, kind, page):
+    if kind == 'chapter':
+        return parser._parse_chapter_page(page)
+    if kind == 'book':
+        return parser.parse_book_info(page)
+    if kind == 'rank':
+        return parser.parse_rank_books(page)
+    raise ValueError(f"未知的页面类型: {kind}")
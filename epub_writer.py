@@ -0,0 +1,191 @@
+import os
+import time
+import shutil
+import zipfile
+from html import escape
+
+
+XHTML_TEMPLATE = '''<?xml version='1.0' encoding='utf-8'?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{lang}" xml:lang="{lang}">
+  <head>
+    <title>{title}</title>
+{links}  </head>
+  <body>{body}</body>
+</html>
+'''
+
+CONTAINER_XML = '''<?xml version="1.0" encoding="utf-8"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles>
+    <rootfile media-type="application/oebps-package+xml" full-path="EPUB/content.opf"/>
+  </rootfiles>
+</container>
+'''
+
+COPY_CHUNK_BYTES = 64 * 1024
+
+IMAGE_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+
+class StreamingEpubWriter:
+    """
+    流式 EPUB 写入器。
+    章节和图片到达时立即写入 zip 容器，内存中只保留清单信息 (文件名、标题、类型)，
+    OPF/NCX/导航页在 close 时根据这些信息生成。峰值内存与书籍长度无关。
+    写入过程中输出到 .tmp 临时文件，close 成功后才替换为正式文件 (或调用方指定的路径)。
+    """
+
+    def __init__(self, filepath, title, author, language='zh', identifier=None, description=''):
+        self.filepath = filepath
+        self.part_path = filepath + '.tmp'
+        self.title = title
+        self.author = author
+        self.language = language
+        self.identifier = identifier or f'fanqie-{int(time.time())}'
+        self.description = description
+        self.cover_id = None
+        self.manifest = [] # (id, href, media_type, properties)
+        self.hrefs = set()
+        self.closed = False
+
+        self.zip = zipfile.ZipFile(self.part_path, 'w', zipfile.ZIP_DEFLATED)
+        # mimetype 必须是第一个条目且不压缩
+        self.zip.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        self.zip.writestr('META-INF/container.xml', CONTAINER_XML)
+
+    def add_item(self, item_id, href, data, media_type, properties=None, compress=True):
+        """
+        写入一个文件到 EPUB/ 目录并登记到清单。
+        data 可以是 str/bytes，也可以是可读的文件对象 (按块复制到 zip，不整体读入内存)。
+        """
+        if href in self.hrefs:
+            return
+        self.hrefs.add(href)
+        compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        if hasattr(data, 'read'):
+            info = zipfile.ZipInfo(f'EPUB/{href}', date_time=time.localtime()[:6])
+            info.compress_type = compress_type
+            with self.zip.open(info, 'w') as dest:
+                shutil.copyfileobj(data, dest, COPY_CHUNK_BYTES)
+        else:
+            self.zip.writestr(f'EPUB/{href}', data, compress_type=compress_type)
+        self.manifest.append((item_id, href, media_type, properties))
+
+    def add_image(self, item_id, href, data):
+        ext = href.rsplit('.', 1)[-1].lower()
+        # 图片本身已压缩，直接存储
+        self.add_item(item_id, href, data, IMAGE_TYPES.get(ext, f'image/{ext}'), compress=False)
+
+    def add_page(self, item_id, href, title, body, css_href=None):
+        """写入一个 XHTML 页面，body 为页面正文 (需为合法 XHTML 片段)"""
+        links = f'    <link href="{css_href}" rel="stylesheet" type="text/css"/>\n' if css_href else ''
+        content = XHTML_TEMPLATE.format(lang=self.language, title=escape(title), links=links, body=body)
+        self.add_item(item_id, href, content, 'application/xhtml+xml')
+
+    def set_cover(self, href, data):
+        ext = href.rsplit('.', 1)[-1].lower()
+        self.add_item('cover-img', href, data, IMAGE_TYPES.get(ext, f'image/{ext}'), properties='cover-image', compress=False)
+        self.add_page('cover', 'cover.xhtml', 'Cover', f'<img src="{href}" alt="Cover"/>')
+        self.cover_id = 'cover-img'
+
+    def close(self, spine, toc, filepath=None):
+        """
+        写入导航文件和 OPF，完成 EPUB。
+        :param spine: 阅读顺序，页面 id 列表
+        :param toc: 目录，(href, 标题) 列表
+        :param filepath: 保存路径，默认为创建时指定的正式文件
+        返回: 保存的文件路径
+        """
+        filepath = filepath or self.filepath
+        self._write_nav(toc)
+        self._write_ncx(toc)
+        self._write_opf(spine)
+        self.zip.close()
+        os.replace(self.part_path, filepath)
+        self.closed = True
+        return filepath
+
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        self.closed = True
+        try:
+            self.zip.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+    def _write_nav(self, toc):
+        items = ''.join(f'\n        <li>\n          <a href="{href}">{escape(title)}</a>\n        </li>' for href, title in toc)
+        body = f'''
+    <nav epub:type="toc" id="id" role="doc-toc">
+      <h2>{escape(self.title)}</h2>
+      <ol>{items}
+      </ol>
+    </nav>
+  '''
+        self.add_item('nav', 'nav.xhtml', XHTML_TEMPLATE.format(lang=self.language, title=escape(self.title), links='', body=body),
+                      'application/xhtml+xml', properties='nav')
+
+    def _write_ncx(self, toc):
+        points = []
+        for order, (href, title) in enumerate(toc):
+            points.append(f'''
+    <navPoint id="navpoint_{order}" playOrder="{order + 1}">
+      <navLabel>
+        <text>{escape(title)}</text>
+      </navLabel>
+      <content src="{href}"/>
+    </navPoint>''')
+        content = f'''<?xml version='1.0' encoding='utf-8'?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head>
+    <meta content="{escape(self.identifier)}" name="dtb:uid"/>
+    <meta content="1" name="dtb:depth"/>
+    <meta content="0" name="dtb:totalPageCount"/>
+    <meta content="0" name="dtb:maxPageNumber"/>
+  </head>
+  <docTitle>
+    <text>{escape(self.title)}</text>
+  </docTitle>
+  <navMap>{"".join(points)}
+  </navMap>
+</ncx>
+'''
+        self.add_item('ncx', 'toc.ncx', content, 'application/x-dtbncx+xml')
+
+    def _write_opf(self, spine):
+        modified = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        cover_meta = f'\n    <meta name="cover" content="{self.cover_id}"/>' if self.cover_id else ''
+        items = []
+        for item_id, href, media_type, properties in self.manifest:
+            props = f' properties="{properties}"' if properties else ''
+            items.append(f'\n    <item href="{href}" id="{item_id}" media-type="{media_type}"{props}/>')
+        itemrefs = ''.join(f'\n    <itemref idref="{item_id}"/>' for item_id in spine)
+        content = f'''<?xml version='1.0' encoding='utf-8'?>
+<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+    <meta property="dcterms:modified">{modified}</meta>
+    <dc:identifier id="id">{escape(self.identifier)}</dc:identifier>
+    <dc:title>{escape(self.title)}</dc:title>
+    <dc:language>{self.language}</dc:language>
+    <dc:creator id="creator">{escape(self.author)}</dc:creator>
+    <dc:description>{escape(self.description)}</dc:description>{cover_meta}
+  </metadata>
+  <manifest>{"".join(items)}
+  </manifest>
+  <spine toc="ncx">{itemrefs}
+  </spine>
+</package>
+'''
+        # OPF 不登记到自身清单中
+        self.zip.writestr('EPUB/content.opf', content)
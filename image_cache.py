@@ -0,0 +1,251 @@
+import io
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+CHUNK_BYTES = 64 * 1024
+
+
+class ImageCache:
+    """
+    按内容寻址的图片缓存，进程内共享。
+    - URL 映射到内容哈希 (SHA-1)，内容相同的图片只保存一份
+    - 内存层保存较小的图片，磁盘层 (可选) 跨进程重启保留，两层都按最近最少使用 (LRU) 淘汰
+    - 同一 URL 同时被多个线程请求时只下载一次，其余线程等待结果
+    线程安全。
+    """
+
+    def __init__(self, memory_bytes=32 * 1024 * 1024, max_item_bytes=4 * 1024 * 1024):
+        """
+        :param memory_bytes: 内存层总大小上限 (字节)
+        :param max_item_bytes: 单张图片超过该大小时不放入内存层
+        """
+        self.memory_bytes = memory_bytes
+        self.max_item_bytes = max_item_bytes
+        self.lock = threading.Lock()
+        self.urls = {} # URL -> 内容哈希
+        self.memory = OrderedDict() # 内容哈希 -> bytes，按最近使用时间从旧到新排列
+        self.memory_total = 0
+        self.inflight = {} # 正在下载的 URL -> threading.Event
+
+        # 磁盘层，通过 enable_disk 启用
+        self.cache_dir = None
+        self.disk_bytes = 0
+        self.disk = OrderedDict() # 内容哈希 -> 文件大小
+        self.disk_total = 0
+
+    def enable_disk(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        """
+        启用磁盘层，并载入已有的图片及 URL 映射。
+        :param cache_dir: 缓存目录
+        :param max_bytes: 磁盘层总大小上限 (字节)
+        """
+        with self.lock:
+            if self.cache_dir == cache_dir:
+                self.disk_bytes = max_bytes
+                return
+            os.makedirs(cache_dir, exist_ok=True)
+            self.cache_dir = cache_dir
+            self.disk_bytes = max_bytes
+            self.disk.clear()
+            self.disk_total = 0
+            self._load_disk()
+        self._evict_disk()
+
+    def _load_disk(self):
+        """扫描缓存目录，按文件修改时间重建 LRU 顺序，并读取 URL 映射"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                if len(fname) != 40:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, fname))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, fname, stat.st_size))
+        entries.sort()
+        for _, digest, size in entries:
+            self.disk[digest] = size
+            self.disk_total += size
+
+        lines = 0
+        try:
+            with open(self._urls_path(), 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('h') in self.disk:
+                        self.urls[record['u']] = record['h']
+        except OSError:
+            pass
+        # 映射文件只追加，失效的记录较多时重写
+        if lines > 2 * len(self.urls) + 100:
+            self._rewrite_urls()
+
+    def _urls_path(self):
+        return os.path.join(self.cache_dir, 'urls.jsonl')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _rewrite_urls(self):
+        tmp_path = self._urls_path() + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for url, digest in self.urls.items():
+                    f.write(json.dumps({'u': url, 'h': digest}, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self._urls_path())
+        except OSError:
+            pass
+
+    def open(self, url, download):
+        """
+        返回 URL 对应的图片。
+        :param download: 未命中时调用 download(url) 下载，返回可读的文件对象或 None
+        返回: (内容哈希, 已定位到开头的文件对象)，调用方负责关闭；下载失败返回 None
+        """
+        entry = self._lookup(url)
+        if entry:
+            return entry
+        with self.lock:
+            event = self.inflight.get(url)
+            owner = event is None
+            if owner:
+                event = self.inflight[url] = threading.Event()
+        if not owner:
+            # 其他线程正在下载同一 URL，等待其完成后直接读取缓存
+            event.wait()
+            return self._lookup(url)
+        try:
+            return self._store(url, download(url))
+        finally:
+            with self.lock:
+                del self.inflight[url]
+            event.set()
+
+    def _lookup(self, url):
+        with self.lock:
+            digest = self.urls.get(url)
+            if digest is None:
+                return None
+            data = self.memory.get(digest)
+            if data is not None:
+                self.memory.move_to_end(digest)
+                return digest, io.BytesIO(data)
+            size = self.disk.get(digest)
+            if size is not None:
+                self.disk.move_to_end(digest)
+        if size is not None:
+            path = self._blob_path(digest)
+            try:
+                if size <= self.max_item_bytes:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    os.utime(path)
+                    self._put_memory(digest, data)
+                    return digest, io.BytesIO(data)
+                os.utime(path)
+                return digest, open(path, 'rb')
+            except OSError:
+                self._discard_disk(digest)
+        # 两层都已淘汰
+        with self.lock:
+            self.urls.pop(url, None)
+        return None
+
+    def _store(self, url, image):
+        if image is None:
+            return None
+        sha1 = hashlib.sha1()
+        size = 0
+        for chunk in iter(lambda: image.read(CHUNK_BYTES), b''):
+            sha1.update(chunk)
+            size += len(chunk)
+        digest = sha1.hexdigest()
+        image.seek(0)
+
+        if self.cache_dir:
+            self._put_disk(digest, image, size)
+            image.seek(0)
+            with self.lock:
+                if self.urls.get(url) != digest:
+                    try:
+                        with open(self._urls_path(), 'a', encoding='utf-8') as f:
+                            f.write(json.dumps({'u': url, 'h': digest}, ensure_ascii=False) + '\n')
+                    except OSError:
+                        pass
+        with self.lock:
+            self.urls[url] = digest
+
+        if size <= self.max_item_bytes:
+            data = image.read()
+            image.close()
+            self._put_memory(digest, data)
+            return digest, io.BytesIO(data)
+        return digest, image
+
+    def _put_memory(self, digest, data):
+        with self.lock:
+            if digest in self.memory:
+                self.memory.move_to_end(digest)
+                return
+            self.memory[digest] = data
+            self.memory_total += len(data)
+            while self.memory_total > self.memory_bytes and len(self.memory) > 1:
+                _, old = self.memory.popitem(last=False)
+                self.memory_total -= len(old)
+
+    def _put_disk(self, digest, image, size):
+        with self.lock:
+            if digest in self.disk:
+                # 内容相同的图片已保存过
+                self.disk.move_to_end(digest)
+                return
+        path = self._blob_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，避免读到写了一半的内容
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: image.read(CHUNK_BYTES), b''):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self.lock:
+            self.disk_total += size - self.disk.pop(digest, 0)
+            self.disk[digest] = size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """淘汰最久未使用的图片，直到磁盘层总大小不超过上限"""
+        evicted = []
+        with self.lock:
+            while self.disk_total > self.disk_bytes and len(self.disk) > 1:
+                old_digest, old_size = self.disk.popitem(last=False)
+                self.disk_total -= old_size
+                evicted.append(old_digest)
+        for old_digest in evicted:
+            try:
+                os.remove(self._blob_path(old_digest))
+            except OSError:
+                pass
+
+    def _discard_disk(self, digest):
+        with self.lock:
+            self.disk_total -= self.disk.pop(digest, 0)
+        try:
+            os.remove(self._blob_path(digest))
+        except OSError:
+            pass
+
+
+# 进程内共享的图片缓存，下载器与界面封面加载共用
+global_image_cache = ImageCache()
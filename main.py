@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 import openpyxl
 import traceback
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
@@ -38,6 +39,12 @@ class MainWindow(QMainWindow):
         QTimer.singleShot(1000, lambda: self.check_for_updates())
 
         self.downloader = FanqieDownloader()
+        # 启用章节内容磁盘缓存：同一本书换格式或中断后重下不再重复请求
+        self.downloader.enable_cache(os.path.join(os.getcwd(), "cache"))
+        # 多核机器上把页面解析放到子进程，下载线程不再与界面线程争抢 GIL
+        cpu_count = os.cpu_count() or 1
+        if cpu_count >= 4:
+            self.downloader.enable_parse_pool(min(4, cpu_count - 1))
         
         # 初始化下载管理器
         self.download_manager = DownloadManager(self.downloader)
@@ -75,6 +82,11 @@ class MainWindow(QMainWindow):
         
         # 加载保存的 Cookies
         self.load_cookies()
+
+        # 恢复上次退出或崩溃时未完成的下载队列 (需在加载 Cookies 之后)，之后的队列变化持续写入日志
+        restored = self.download_manager.enable_journal(os.path.join(os.getcwd(), "download_queue.db"))
+        if restored:
+            self.log(f"已恢复上次未完成的 {restored} 个下载任务")
         
         # 初始加载
         self.web_view.setUrl(QUrl("https://fanqienovel.com/"))
@@ -98,6 +110,7 @@ class MainWindow(QMainWindow):
         self.download_window.cancel_all_signal.connect(self.download_manager.cancel_all)
         self.download_window.clear_finished_signal.connect(self.download_window.clear_finished_items)
         self.download_window.max_concurrent_changed.connect(self.download_manager.set_max_concurrent_tasks)
+        self.download_window.request_budget_changed.connect(self.download_manager.set_request_budget)
         
         # Manager -> UI
         self.download_manager.task_added.connect(self.on_task_added)
@@ -609,14 +622,14 @@ class MainWindow(QMainWindow):
         # 显示选择对话框
         dialog = ChapterSelectionDialog(len(book_info['chapters']), self)
         if dialog.exec():
-            indices, split_files, delay, fmt = dialog.get_data()
-            self.start_real_download(book_info, indices, split_files, delay, fmt)
+            indices, split_files, delay, fmt, concurrency = dialog.get_data()
+            self.start_real_download(book_info, indices, split_files, delay, fmt, concurrency)
         else:
             self.log("用户取消下载")
             self.download_btn.setEnabled(True)
             self.check_download_availability() # 如果需要，恢复批量按钮
 
-    def start_real_download(self, book_info, indices, split_files, delay=-1, fmt='txt'):
+    def start_real_download(self, book_info, indices, split_files, delay=-1, fmt='txt', concurrency=1):
         self.log("开始下载任务...")
         
         save_dir = os.path.join(os.getcwd(), "downloads")
@@ -635,7 +648,8 @@ class MainWindow(QMainWindow):
             chapter_indices=indices, 
             split_files=split_files,
             delay=delay,
-            title=book_info.get('title')
+            title=book_info.get('title'),
+            concurrency=concurrency
         )
         
         self.log("任务已添加至下载队列")
@@ -668,8 +682,8 @@ class MainWindow(QMainWindow):
         # 1. 询问设置
         dialog = BatchOptionsDialog(self)
         if dialog.exec():
-            start, end, chapter_limit, fmt, split_files, delay = dialog.get_data()
-            self.start_batch_download(start, end, chapter_limit, fmt, split_files, delay)
+            start, end, chapter_limit, fmt, split_files, delay, concurrency = dialog.get_data()
+            self.start_batch_download(start, end, chapter_limit, fmt, split_files, delay, concurrency)
         else:
             self.log("取消批量下载")
 
@@ -728,7 +742,7 @@ class MainWindow(QMainWindow):
                 
         return level1, level2, level3
 
-    def start_batch_download(self, start, end, chapter_limit, fmt='txt', split_files=False, delay=-1):
+    def start_batch_download(self, start, end, chapter_limit, fmt='txt', split_files=False, delay=-1, concurrency=1):
         self.log(f"准备批量下载 (第 {start} - {end} 本)...")
         self.batch_btn.setEnabled(False)
 
@@ -744,7 +758,8 @@ class MainWindow(QMainWindow):
             'chapter_limit': chapter_limit,
             'fmt': fmt,
             'split_files': split_files,
-            'delay': delay
+            'delay': delay,
+            'concurrency': concurrency
         }
 
         self.web_view.page().toHtml(self.on_batch_html_ready)
@@ -770,6 +785,7 @@ class MainWindow(QMainWindow):
         fmt = self.batch_config['fmt']
         split_files = self.batch_config['split_files']
         delay = self.batch_config['delay']
+        concurrency = self.batch_config['concurrency']
         
         # 计算切片
         slice_start = max(0, start - 1)
@@ -835,7 +851,8 @@ class MainWindow(QMainWindow):
                 split_files=split_files,
                 delay=delay,
                 chapter_limit=chapter_limit,
-                title=book.get('title')
+                title=book.get('title'),
+                concurrency=concurrency
             )
             added_tasks.append((task_id, book['url']))
             
@@ -863,6 +880,9 @@ class MainWindow(QMainWindow):
         dialog.exec()
 
 if __name__ == "__main__":
+    # 打包为 exe 后，解析进程池的子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
+
     if hasattr(Qt, 'AA_EnableHighDpiScaling'):
         QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     if hasattr(Qt, 'AA_UseHighDpiPixmaps'):
@@ -0,0 +1,78 @@
+import threading
+
+
+# 页面类别
+PAGE_CONTENT = 'content' # 正常章节页，需要完整解析
+PAGE_WAF = 'waf' # 验证码/风控页
+PAGE_VIP = 'vip' # 没有正文节点 (VIP 锁定等)
+PAGE_ERROR = 'error' # HTTP 错误或空响应
+
+PAGE_LABELS = {
+    PAGE_CONTENT: '正文',
+    PAGE_WAF: '风控',
+    PAGE_VIP: '锁定',
+    PAGE_ERROR: '错误',
+}
+
+CONTENT_MARKER = b'muye-reader-content'
+WAF_BODY_MARKERS = (b'captcha', b'verify')
+WAF_TITLE_MARKERS = (b'WAF', '验证'.encode('utf-8'))
+WAF_URL_MARKERS = ('captcha', 'verify')
+
+
+def classify_page(status_code, body, location=''):
+    """
+    只根据状态码、重定向地址和原始响应字节判断页面类别，不构建 DOM。
+    判断规则与原先解析后的检查一致：有正文节点即为正文页；
+    否则标题含 WAF/验证 或页面含 captcha/verify 视为风控页，其余视为锁定页。
+    :param status_code: HTTP 状态码
+    :param body: 响应内容 (bytes)
+    :param location: 重定向后的地址，没有重定向时为空
+    返回: PAGE_CONTENT / PAGE_WAF / PAGE_VIP / PAGE_ERROR
+    """
+    if status_code >= 400:
+        return PAGE_ERROR
+    if location and any(marker in location for marker in WAF_URL_MARKERS):
+        return PAGE_WAF
+    if not body:
+        return PAGE_ERROR
+    if CONTENT_MARKER in body:
+        return PAGE_CONTENT
+    return classify_missing_content(body)
+
+
+def classify_missing_content(body):
+    """
+    页面中没有正文节点时，区分风控页和锁定页。
+    <head> 中可能有很大的内联脚本或样式，<title> 在整个响应中查找 (bytes.find 足够快)。
+    """
+    start = body.find(b'<title')
+    if start >= 0:
+        end = body.find(b'</title', start)
+        title = body[start:end if end >= 0 else len(body)]
+        if any(marker in title for marker in WAF_TITLE_MARKERS):
+            return PAGE_WAF
+    if any(marker in body for marker in WAF_BODY_MARKERS):
+        return PAGE_WAF
+    return PAGE_VIP
+
+
+class PageStats:
+    """按类别统计章节响应数量，线程安全"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(PAGE_LABELS, 0)
+
+    def record(self, kind):
+        with self.lock:
+            self.counts[kind] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def describe(self):
+        """生成简短统计文本，只列出出现过的异常类别 (风控/锁定/错误)，没有异常时返回空字符串"""
+        counts = self.snapshot()
+        return ' '.join(f"{PAGE_LABELS[kind]} {count}" for kind, count in counts.items() if count and kind != PAGE_CONTENT)
@@ -0,0 +1,63 @@
+import os
+import json
+
+
+class ProgressManifest:
+    """
+    下载进度清单，与输出文件放在一起。
+    每写入一章追加一行 JSON 记录 (章节索引、URL、标题、字节偏移、长度、内容哈希)，
+    写完一行立即刷新，崩溃时最多丢失最后一条未写完的记录。
+    续传时读取全部记录，逐条与当前目录的章节 URL 核对 (识别缺章和改动过的章节)，不再扫描输出文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """读取全部有效记录，忽略损坏的行 (如崩溃时写了一半的最后一行)"""
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return records
+
+    def open(self, append=False):
+        """开始写入；非追加模式会清空已有记录"""
+        if append and self.exists():
+            self._drop_partial_line()
+        self.file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+
+    def record(self, **fields):
+        """追加一条章节记录"""
+        self.file.write(json.dumps(fields, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def rewrite(self, records):
+        """用给定的记录替换清单内容 (先写临时文件再替换)"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for fields in records:
+                f.write(json.dumps(fields, ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _drop_partial_line(self):
+        # 截掉末尾没有换行的残缺记录，避免新记录与其拼接在同一行
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
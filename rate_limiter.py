@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class AdaptiveRateController:
+    """
+    自适应请求速率控制 (AIMD)。
+    响应正常时加性提高速率，遇到验证码、慢响应或 4xx/5xx 时乘性降低速率，
+    从而在不触发风控的前提下尽量接近服务器允许的真实上限。
+    线程安全，可被多个下载线程共享。
+    """
+
+    def __init__(self, initial_rate=1.0, min_rate=0.2, max_rate=5.0, increase_step=0.05,
+                 decrease_factor=0.5, slow_threshold=3.0, verification_cooldown=30.0):
+        """
+        :param initial_rate: 初始速率 (请求/秒)
+        :param min_rate: 速率下限
+        :param max_rate: 速率上限
+        :param increase_step: 每次成功响应增加的速率
+        :param decrease_factor: 每次异常时速率乘以该系数
+        :param slow_threshold: 响应耗时超过该秒数视为慢响应
+        :param verification_cooldown: 触发验证码后暂停发起请求的秒数
+        """
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.slow_threshold = slow_threshold
+        self.verification_cooldown = verification_cooldown
+
+        self.lock = threading.Lock()
+        self.next_time = 0.0 # 下一个可用请求时刻 (monotonic)
+        self.backoff_until = 0.0 # 退避结束时刻 (monotonic)
+        self.last_reason = "" # 最近一次降速原因
+
+    def acquire(self):
+        """阻塞直到允许发起下一个请求"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time, self.backoff_until)
+            # 保留一定随机抖动，避免请求间隔过于规律
+            self.next_time = start + random.uniform(0.8, 1.2) / self.rate
+        wait = start - now
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self, latency):
+        """记录一次正常响应，latency 为请求耗时 (秒)"""
+        if latency > self.slow_threshold:
+            self.on_failure(f"响应缓慢 {latency:.1f}s")
+            return
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_failure(self, reason, verification=False):
+        """记录一次异常响应，速率乘性下降；验证码额外进入冷却期"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.last_reason = reason
+            if verification:
+                self.backoff_until = time.monotonic() + self.verification_cooldown
+
+    def set_max_rate(self, max_rate):
+        """调整速率上限 (如跟随站点的令牌桶速率)，当前速率超过上限时一并降低"""
+        with self.lock:
+            self.max_rate = max(self.min_rate, max_rate)
+            self.rate = min(self.rate, self.max_rate)
+
+    def snapshot(self):
+        """返回当前状态: {'rate', 'backing_off', 'backoff_remaining', 'reason'}"""
+        with self.lock:
+            remaining = max(0.0, self.backoff_until - time.monotonic())
+            return {
+                'rate': self.rate,
+                'backing_off': remaining > 0,
+                'backoff_remaining': remaining,
+                'reason': self.last_reason
+            }
+
+    def describe(self):
+        """生成用于进度显示的简短状态文本"""
+        state = self.snapshot()
+        if state['backing_off']:
+            return f"退避中 {state['backoff_remaining']:.0f}s ({state['reason']})"
+        return f"{state['rate']:.2f} 章/秒"
+
+
+class TokenBucket:
+    """
+    令牌桶限流器：以 rate 的速度补充令牌，最多积累 capacity 个。
+    acquire 在令牌不足时预支令牌并休眠，多个线程按到达顺序依次放行。
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            # 令牌为负表示已被预支，需要等待补足
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def set_rate(self, rate, capacity=None):
+        """调整速率与容量，已积累的令牌按新容量截断"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            if capacity is not None:
+                self.capacity = capacity
+            self.tokens = min(self.tokens, self.capacity)
+
+
+class HostRateLimiter:
+    """
+    按主机划分的令牌桶集合。
+    未配置速率的主机 (如图片 CDN) 不限流。
+    """
+
+    def __init__(self, rates=None):
+        """
+        :param rates: 初始配置 {host: 速率(次/秒)}
+        """
+        self.buckets = {}
+        self.lock = threading.Lock()
+        for host, rate in (rates or {}).items():
+            self.set_rate(host, rate)
+
+    def set_rate(self, host, rate, burst=None):
+        """设置主机的总请求速率，burst 为允许的突发请求数 (默认与速率相同，至少为 1)"""
+        capacity = burst if burst is not None else max(1.0, rate)
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket:
+                bucket.set_rate(rate, capacity)
+            else:
+                self.buckets[host] = TokenBucket(rate, capacity)
+
+    def get_rate(self, host):
+        bucket = self.buckets.get(host)
+        return bucket.rate if bucket else None
+
+    def acquire(self, url):
+        """请求 url 之前调用，按其主机的令牌桶等待"""
+        bucket = self.buckets.get(urlparse(url).hostname)
+        if bucket:
+            bucket.acquire()
+
+
+# 进程级共享实例：所有下载任务及书籍信息获取线程共用同一份请求预算，
+# 总请求速率不随并发任务数增长
+global_limiter = HostRateLimiter({'fanqienovel.com': 2.0})
@@ -0,0 +1,107 @@
+import json
+import time
+import sqlite3
+
+
+class TaskJournal:
+    """
+    下载队列日志，保存在本地 SQLite 数据库 (WAL 模式)。
+    每个未完成的任务一行，记录任务参数、状态和进度，程序退出或崩溃后据此恢复队列；
+    任务完成或取消后删除对应的行。
+    每次变化只更新一行；WAL 模式下提交只是在日志文件末尾追加，开销很小。
+    章节级的续传位置由输出文件旁的进度清单决定，这里的进度只用于恢复后的界面显示，
+    因此进度更新先在内存中合并，最多每 progress_interval 秒写入一次，状态变化立即写入。
+    只能在创建它的线程 (界面线程) 中使用。
+    """
+
+    # book_info 体积大 (含完整目录)，恢复后由工作线程重新获取，不保存
+    SKIPPED_PARAMS = ('book_info',)
+
+    def __init__(self, path, progress_interval=1.0):
+        """
+        :param path: 数据库文件路径
+        :param progress_interval: 进度更新的最短提交间隔 (秒)
+        """
+        self.path = path
+        self.progress_interval = progress_interval
+        self.last_flush = 0
+        self.pending = {} # 任务 ID -> 尚未写入的进度 (current, total, title, cover_url)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 仍能保证崩溃后数据库一致，只是断电时可能丢失最后几次提交
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                title TEXT,
+                cover_url TEXT,
+                current INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.commit()
+
+    def _write(self, sql=None, args=()):
+        """执行一条语句，并把积累的进度一起写入，作为一个事务提交"""
+        try:
+            with self.conn:
+                if sql:
+                    self.conn.execute(sql, args)
+                if self.pending:
+                    self.conn.executemany("UPDATE tasks SET current = ?, total = ?, title = ?, cover_url = ? WHERE id = ?",
+                                          [(*progress, task_id) for task_id, progress in self.pending.items()])
+        except sqlite3.Error as e:
+            print(f"任务日志写入失败: {e}")
+        self.pending.clear()
+        self.last_flush = time.monotonic()
+
+    def add(self, task):
+        """记录新任务 (已存在时覆盖)"""
+        params = {k: v for k, v in task.kwargs.items() if k not in self.SKIPPED_PARAMS}
+        self._write(
+            "INSERT OR REPLACE INTO tasks (id, seq, type, params, status, title, cover_url, current, total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (task.id, task.seq, task.type, json.dumps(params, ensure_ascii=False), task.status,
+             task.title, task.cover_url, task.progress[0], task.progress[1]))
+
+    def set_status(self, task_id, status):
+        self._write("UPDATE tasks SET status = ? WHERE id = ?", (status, task_id))
+
+    def set_progress(self, task_id, current, total, title, cover_url):
+        self.pending[task_id] = (current, total, title, cover_url)
+        if time.monotonic() - self.last_flush >= self.progress_interval:
+            self._write()
+
+    def set_title(self, task_id, title):
+        self._write("UPDATE tasks SET title = ? WHERE id = ?", (title, task_id))
+
+    def remove(self, task_id):
+        self.pending.pop(task_id, None)
+        self._write("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def load(self):
+        """
+        读取所有未完成的任务，按添加顺序排列。
+        返回: 字典列表，键为 id, type, params (参数字典), status, title, cover_url, current, total
+        """
+        rows = self.conn.execute(
+            "SELECT id, type, params, status, title, cover_url, current, total FROM tasks ORDER BY seq").fetchall()
+        records = []
+        for task_id, task_type, params, status, title, cover_url, current, total in rows:
+            try:
+                params = json.loads(params)
+            except ValueError:
+                continue
+            records.append({'id': task_id, 'type': task_type, 'params': params, 'status': status,
+                            'title': title, 'cover_url': cover_url, 'current': current, 'total': total})
+        return records
+
+    def close(self):
+        self._write()
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
@@ -46,24 +46,29 @@ class BatchOptionsDialog(QDialog):
         h2.addWidget(self.spin_chapter_limit)
         layout.addLayout(h2)
 
-        # 格式选择
+        # 格式选择 (可同时勾选多种格式，章节只获取一次)
         h3 = QHBoxLayout()
         h3.addWidget(QLabel("保存格式:"))
-        self.combo_fmt = QComboBox()
-        self.combo_fmt.addItems(["txt", "epub", "md"])
-        h3.addWidget(self.combo_fmt)
+        self.fmt_checks = {}
+        for fmt in ["txt", "epub", "md"]:
+            check = QCheckBox(fmt)
+            check.setChecked(fmt == "txt")
+            self.fmt_checks[fmt] = check
+            h3.addWidget(check)
+        h3.addStretch()
         layout.addLayout(h3)
 
         # 延迟设置
         h_delay = QHBoxLayout()
         h_delay.addWidget(QLabel("下载间隔:"))
         self.combo_delay = QComboBox()
-        self.combo_delay.addItems(["随机 (推荐)", "自定义"])
+        self.combo_delay.addItems(["自适应 (推荐)", "自定义"])
+        self.combo_delay.setToolTip("自适应：根据服务器响应自动调整请求速率，遇到验证码或异常时自动降速")
         self.spin_delay = QDoubleSpinBox()
         self.spin_delay.setRange(0.1, 60.0)
         self.spin_delay.setValue(1.0)
         self.spin_delay.setSingleStep(0.1)
-        self.spin_delay.setEnabled(False) # 默认随机，禁用输入框
+        self.spin_delay.setEnabled(False) # 默认自适应，禁用输入框
         
         self.combo_delay.currentIndexChanged.connect(self.on_delay_changed)
         
@@ -76,6 +81,16 @@ class BatchOptionsDialog(QDialog):
         self.lbl_delay_tip.setStyleSheet("color: red; font-size: 10px;")
         layout.addWidget(self.lbl_delay_tip)
 
+        # 单本章节并发数
+        h_conc = QHBoxLayout()
+        h_conc.addWidget(QLabel("每本同时下载章节数:"))
+        self.spin_concurrency = QSpinBox()
+        self.spin_concurrency.setRange(1, 8)
+        self.spin_concurrency.setValue(1)
+        self.spin_concurrency.setToolTip("大于 1 时同一本书的多个章节并行获取，仍按顺序写入。并发越高越容易触发验证码。")
+        h_conc.addWidget(self.spin_concurrency)
+        layout.addLayout(h_conc)
+
         # 提示用户滑动页面
         self.lbl_scroll_tip = QLabel("⚠️ 注意：批量下载前请先在页面中向下滚动，确保要下载的书籍已加载出来。")
         self.lbl_scroll_tip.setStyleSheet("color: #E6A23C; font-weight: bold; margin-top: 10px;")
@@ -102,21 +117,31 @@ class BatchOptionsDialog(QDialog):
         layout.addLayout(btn_layout)
         
     def on_delay_changed(self, index):
-        if index == 0: # 随机
+        if index == 0: # 自适应
             self.spin_delay.setEnabled(False)
             self.lbl_delay_tip.setText("")
         else: # 自定义
             self.spin_delay.setEnabled(True)
             self.lbl_delay_tip.setText("⚠️ 警告: 间隔过短(<1s)极易触发验证码风控，请谨慎设置！")
 
+    def selected_formats(self):
+        return [fmt for fmt, check in self.fmt_checks.items() if check.isChecked()]
+
+    def accept(self):
+        if not self.selected_formats():
+            QMessageBox.warning(self, "提示", "请至少选择一种保存格式")
+            return
+        super().accept()
+
     def get_data(self):
+        # 返回 (start, end, chapter_limit, fmts, split_files, delay, concurrency)，fmts 是格式名列表
         delay = -1 if self.combo_delay.currentIndex() == 0 else self.spin_delay.value()
         start = self.spin_book_start.value()
         end = self.spin_book_end.value()
         # 自动纠正大小
         if start > end:
             start, end = end, start
-        return start, end, self.spin_chapter_limit.value(), self.combo_fmt.currentText(), self.check_split.isChecked(), delay
+        return start, end, self.spin_chapter_limit.value(), self.selected_formats(), self.check_split.isChecked(), delay, self.spin_concurrency.value()
 
 class CustomWebEnginePage(QWebEnginePage):
     """自定义页面以在同一视图中打开链接而不是新标签页"""
@@ -187,9 +212,14 @@ class ChapterSelectionDialog(QDialog):
         # 格式选择
         h_fmt = QHBoxLayout()
         h_fmt.addWidget(QLabel("保存格式:"))
-        self.combo_fmt = QComboBox()
-        self.combo_fmt.addItems(["txt", "epub", "md"])
-        h_fmt.addWidget(self.combo_fmt)
+        # 可同时勾选多种格式，章节只获取一次
+        self.fmt_checks = {}
+        for fmt in ["txt", "epub", "md"]:
+            check = QCheckBox(fmt)
+            check.setChecked(fmt == "txt")
+            self.fmt_checks[fmt] = check
+            h_fmt.addWidget(check)
+        h_fmt.addStretch()
         file_layout.addLayout(h_fmt)
 
         self.check_split = QCheckBox("分章保存 (每章一个文件)")
@@ -200,12 +230,13 @@ class ChapterSelectionDialog(QDialog):
         h_delay = QHBoxLayout()
         h_delay.addWidget(QLabel("下载间隔:"))
         self.combo_delay = QComboBox()
-        self.combo_delay.addItems(["随机 (推荐)", "自定义"])
+        self.combo_delay.addItems(["自适应 (推荐)", "自定义"])
+        self.combo_delay.setToolTip("自适应：根据服务器响应自动调整请求速率，遇到验证码或异常时自动降速")
         self.spin_delay = QDoubleSpinBox()
         self.spin_delay.setRange(0.1, 60.0)
         self.spin_delay.setValue(1.0)
         self.spin_delay.setSingleStep(0.1)
-        self.spin_delay.setEnabled(False) # 默认随机
+        self.spin_delay.setEnabled(False) # 默认自适应
         
         self.combo_delay.currentIndexChanged.connect(self.on_delay_changed)
         
@@ -217,6 +248,16 @@ class ChapterSelectionDialog(QDialog):
         self.lbl_delay_tip = QLabel("")
         self.lbl_delay_tip.setStyleSheet("color: red; font-size: 10px;")
         file_layout.addWidget(self.lbl_delay_tip)
+
+        # 章节并发数
+        h_conc = QHBoxLayout()
+        h_conc.addWidget(QLabel("同时下载章节数:"))
+        self.spin_concurrency = QSpinBox()
+        self.spin_concurrency.setRange(1, 8)
+        self.spin_concurrency.setValue(1)
+        self.spin_concurrency.setToolTip("大于 1 时多个章节并行获取，仍按顺序写入。并发越高越容易触发验证码。")
+        h_conc.addWidget(self.spin_concurrency)
+        file_layout.addLayout(h_conc)
         
         layout.addWidget(file_box)
         
@@ -236,22 +277,32 @@ class ChapterSelectionDialog(QDialog):
         self.edit_list.textChanged.connect(lambda: self.radio_list.setChecked(True))
 
     def on_delay_changed(self, index):
-        if index == 0: # 随机
+        if index == 0: # 自适应
             self.spin_delay.setEnabled(False)
             self.lbl_delay_tip.setText("")
         else: # 自定义
             self.spin_delay.setEnabled(True)
             self.lbl_delay_tip.setText("⚠️ 警告: 间隔过短(<1s)极易触发验证码风控，请谨慎设置！")
+
+    def selected_formats(self):
+        return [fmt for fmt, check in self.fmt_checks.items() if check.isChecked()]
+
+    def accept(self):
+        if not self.selected_formats():
+            QMessageBox.warning(self, "提示", "请至少选择一种保存格式")
+            return
+        super().accept()
         
     def get_data(self):
-        # 返回 (indices, split_files, delay, fmt)
-        # indices 是基于0的索引列表，或 None 表示全部
+        # 返回 (indices, split_files, delay, fmts, concurrency)
+        # indices 是基于0的索引列表，或 None 表示全部；fmts 是格式名列表
         split = self.check_split.isChecked()
         delay = -1 if self.combo_delay.currentIndex() == 0 else self.spin_delay.value()
-        fmt = self.combo_fmt.currentText()
+        fmt = self.selected_formats()
+        concurrency = self.spin_concurrency.value()
         
         if self.radio_all.isChecked():
-            return None, split, delay, fmt
+            return None, split, delay, fmt, concurrency
             
         indices = []
         if self.radio_range.isChecked():
@@ -274,7 +325,7 @@ class ChapterSelectionDialog(QDialog):
                     pass
             indices = sorted(list(set(indices)))
             
-        return indices, split, delay, fmt
+        return indices, split, delay, fmt, concurrency
 
 class UpdateFAQWorker(QThread):
     finished = Signal(str)
@@ -82,9 +82,7 @@ class BatchDownloadWorker(QThread):
                     
                     # 立即发送更新信号给UI
                     self.progress_signal.emit(i, total_books, f"已获取: {book_info['title']}")
-                    
-                    # 防止请求过快
-                    time.sleep(0.5)
+                    # 请求频率由下载器的全局令牌桶统一控制
                 except Exception as e:
                     self.log_signal.emit(f"获取书籍信息失败: {book.get('url')} - {str(e)}")
                     # 失败不影响继续，只是标题可能不准
@@ -148,39 +146,20 @@ class BatchDownloadWorker(QThread):
                         status_msg = f"正在下载 [{i+1}/{total_books}]: {real_title} ({curr}/{tot} 章)"
                         self.progress_signal.emit(i, total_books, status_msg)
                     
-                    # 保存
-                    if self.fmt == 'txt':
-                        filepath = self.downloader.save_to_txt(
-                            book_info, 
-                            self.save_dir, 
-                            callback,
-                            chapter_indices=indices,
-                            split_files=self.split_files,
-                            control_callback=self.check_control_status,
-                            delay=self.delay,
-                            max_chapters=self.chapters_count
-                        )
-                    elif self.fmt == 'md':
-                        filepath = self.downloader.save_to_md(
-                            book_info, 
-                            self.save_dir, 
-                            callback,
-                            chapter_indices=indices,
-                            split_files=self.split_files,
-                            control_callback=self.check_control_status,
-                            delay=self.delay,
-                            max_chapters=self.chapters_count
-                        )
-                    else: # epub格式
-                        filepath = self.downloader.save_to_epub(
-                            book_info, 
-                            self.save_dir, 
-                            callback,
-                            chapter_indices=indices,
-                            control_callback=self.check_control_status,
-                            delay=self.delay,
-                            max_chapters=self.chapters_count
-                        )
+                    # 保存 (fmt 可以是单个格式名，也可以是格式名列表)
+                    fmts = self.fmt if isinstance(self.fmt, (list, tuple)) else [self.fmt]
+                    filepaths = self.downloader.save_to_formats(
+                        book_info, 
+                        self.save_dir, 
+                        fmts,
+                        callback,
+                        chapter_indices=indices,
+                        split_files=self.split_files,
+                        control_callback=self.check_control_status,
+                        delay=self.delay,
+                        max_chapters=self.chapters_count
+                    )
+                    filepath = ", ".join(filepaths)
                     
                     self.log_signal.emit(f"[{i+1}/{total_books}] 完成: {real_title} -> {filepath}")
                     success_count += 1
@@ -253,7 +232,7 @@ class DownloadWorker(QThread):
     error_signal = Signal(str)
     verification_needed_signal = Signal(str)
 
-    def __init__(self, downloader, book_url, save_dir, fmt, book_info=None, chapter_indices=None, split_files=False, delay=-1, chapter_limit=0):
+    def __init__(self, downloader, book_url, save_dir, fmt, book_info=None, chapter_indices=None, split_files=False, delay=-1, chapter_limit=0, concurrency=1, resume=False):
         super().__init__()
         self.downloader = downloader
         self.book_url = book_url
@@ -264,6 +243,8 @@ class DownloadWorker(QThread):
         self.split_files = split_files
         self.delay = delay
         self.chapter_limit = chapter_limit
+        self.concurrency = concurrency # 单本书同时获取的章节数
+        self.resume_progress = resume # 从本地进度继续 (恢复中断的任务)
         self.is_paused = False
         self.is_stopped = False
 
@@ -320,38 +301,24 @@ class DownloadWorker(QThread):
                 self.pause()
                 self.check_control_status()
 
-            if self.fmt == 'txt':
-                filepath = self.downloader.save_to_txt(
-                    self.book_info, 
-                    self.save_dir, 
-                    callback,
-                    chapter_indices=self.chapter_indices,
-                    split_files=self.split_files,
-                    control_callback=self.check_control_status,
-                    delay=self.delay,
-                    verification_callback=verify_cb
-                )
-            elif self.fmt == 'md':
-                filepath = self.downloader.save_to_md(
-                    self.book_info, 
-                    self.save_dir, 
-                    callback,
-                    chapter_indices=self.chapter_indices,
-                    split_files=self.split_files,
-                    control_callback=self.check_control_status,
-                    delay=self.delay,
-                    verification_callback=verify_cb
-                )
-            else:
-                filepath = self.downloader.save_to_epub(
-                    self.book_info, 
-                    self.save_dir, 
-                    callback,
-                    chapter_indices=self.chapter_indices,
-                    control_callback=self.check_control_status,
-                    delay=self.delay,
-                    verification_callback=verify_cb
-                )
+            # fmt 可以是单个格式名，也可以是格式名列表 (一次下载，多种格式)
+            fmts = self.fmt if isinstance(self.fmt, (list, tuple)) else [self.fmt]
+            filepaths = self.downloader.save_to_formats(
+                self.book_info, 
+                self.save_dir, 
+                fmts,
+                callback,
+                chapter_indices=self.chapter_indices,
+                split_files=self.split_files,
+                control_callback=self.check_control_status,
+                delay=self.delay,
+                verification_callback=verify_cb,
+                concurrency=self.concurrency,
+                resume=self.resume_progress
+            )
+            for path in filepaths:
+                self.log_signal.emit(f"已保存: {path}")
+            filepath = filepaths[0]
             
             self.finished_signal.emit(filepath)
 
@@ -377,6 +344,6 @@ class TitleCorrectionWorker(QThread):
                 book_info = self.downloader.get_book_info(book_url)
                 if book_info and book_info.get('title'):
                     self.title_updated.emit(task_id, book_info['title'])
-                time.sleep(0.5) # 避免请求过快
+                # 请求频率由下载器的全局令牌桶统一控制，与下载任务共享预算
             except:
                 pass # 失败忽略，保持原样